@@ -1,18 +1,89 @@
-from models import Database
+import asyncio
+
+from models import AsyncDatabase
 from datetime import datetime
-from utils import save_screenshot, host_address
+from utils import host_address
 import json
 
+from alert_pipeline import AlertEvent, AlertPipeline
+from metrics import ALERTS, camera_label
+from screenshots import ScreenshotWriter
+from settings import (
+    ALERT_DB_BATCH,
+    ALERT_DB_RETRIES,
+    ALERT_JOURNAL,
+    ALERT_QUEUE_SIZE,
+    ALERT_WORKERS,
+)
+
 
 class AlertManager:
-    def __init__(self, websocket_manager):
+    def __init__(
+        self, websocket_manager, database=None, latency=None, screenshots=None
+    ):
         self.websocket_manager = websocket_manager
         self.last_alert_time = {}
         self.face_last_seen = {}
-        self.database = Database()
+        self.alerted_tracks = {}  # (url, track id) -> (criminal id, alert time)
+        self.sightings = {}  # criminal id -> latest sighting, alerted or not
+        self.database = database or AsyncDatabase()  # awaitable queries
+        self.screenshots = screenshots or ScreenshotWriter()
+        self.pipeline = AlertPipeline(
+            self.send_alert,
+            self.database,
+            self.screenshots,
+            maxsize=ALERT_QUEUE_SIZE,
+            workers=ALERT_WORKERS,
+            batch_size=ALERT_DB_BATCH,
+            retries=ALERT_DB_RETRIES,
+            journal_path=ALERT_JOURNAL,
+            latency=latency,
+        )
+
+    def already_alerted(self, url, track_id, detected_face, now):
+        """A tracked face raises one alert per identity for the life of its track."""
+        if track_id is None:
+            return False
+        alerted = self.alerted_tracks.get((url, track_id))
+        return alerted is not None and alerted[0] == detected_face
 
-    async def handle_alert(self, detected_face, frame, url):
+    def remember_track(self, url, track_id, detected_face, now):
+        if track_id is None:
+            return
+        self.alerted_tracks[(url, track_id)] = (detected_face, now)
+        for key, (_, alerted_at) in list(self.alerted_tracks.items()):
+            if (now - alerted_at).total_seconds() > 600:
+                del self.alerted_tracks[key]
+
+    def record_sighting(self, detected_face, url, track_id=None):
+        """Cheap in-memory record of every match, confirmed or not."""
+        now = datetime.now()
+        sighting = self.sightings.get(detected_face)
+        # A new camera or track starts a new sighting of the same person
+        if sighting is None or (sighting["url"], sighting["track_id"]) != (
+            url,
+            track_id,
+        ):
+            sighting = self.sightings[detected_face] = {
+                "url": url,
+                "track_id": track_id,
+                "first_seen": now,
+                "frames": 0,
+            }
+        sighting["last_seen"] = now
+        sighting["frames"] += 1
+
+    async def handle_alert(
+        self, detected_face, frame, url, track_id=None, trace=None, bbox=None
+    ):
+        """
+        Decides whether a confirmed match alerts and queues the alert on the
+        pipeline; broadcast, screenshot and database write happen there.
+        """
         now = datetime.now()
+        if self.already_alerted(url, track_id, detected_face, now):
+            self.face_last_seen[detected_face] = now
+            return
         last_alert_time = self.last_alert_time.get(detected_face, datetime.min)
         time_since_last_alert = (now - last_alert_time).total_seconds()
 
@@ -21,36 +92,35 @@ class AlertManager:
         ).total_seconds()
 
         if time_since_last_seen > 5 and time_since_last_alert > 3:
-            year, month, day = datetime.now().timetuple()[:3]
-            path = (
-                f"../media/screenshots/criminals/{detected_face}/{year}/{month}/{day}"
-            )
-            image_name = save_screenshot(frame, path=path, camera_url=url)
-            await self.send_alert(
-                detected_face, url, path=host_address + image_name[2:]
-            )
-            camera_object = self.database.get_camera(url)
-            if camera_object:
-                camera_object = camera_object.get("id")
-            self.database.insert_records(
-                image=f"{host_address}{image_name[2:]}",
-                date_recorded=datetime.now(),
-                criminal=int(detected_face),
-                camera=camera_object,
-            )
-            self.database.add_temp()
+            event = AlertEvent(detected_face, url, frame, trace, bbox=bbox)
+            if not self.pipeline.submit(event):
+                # Leave the face unseen so the next confirmed frame retries
+                return
             self.last_alert_time[detected_face] = now
+            ALERTS.labels(camera_label(url)).inc()
+            self.remember_track(url, track_id, detected_face, now)
 
         self.face_last_seen[detected_face] = now
 
-    async def send_alert(self, detected_face, url, path):
-        details = self.database.get_details(detected_face)
-        camera = self.database.get_camera(url)
+    async def send_alert(
+        self, detected_face, url, path, preview=None, thumbnail=None, captured_at=None
+    ):
+        details, camera = await asyncio.gather(
+            self.database.get_details(detected_face), self.database.get_camera(url)
+        )
         camera["image"] = host_address + "/media/" + camera.get("image")
         details["date_created"] = str(details.get("date_created"))
         details["image"] = (
             host_address + "/media/criminals/" + str(detected_face) + "/" + "main.jpg"
         )
-        result = {"identity": details, "camera": camera, "screenshot": path}
+        result = {
+            "identity": details,
+            "camera": camera,
+            "screenshot": path,
+            # Downscaled frame and face crop, cheaper for clients to fetch
+            "screenshot_preview": preview,
+            "screenshot_thumbnail": thumbnail,
+            "captured_at": captured_at,  # epoch seconds the frame was captured
+        }
         await self.websocket_manager.send_to_all(json.dumps(result))
         print(result)
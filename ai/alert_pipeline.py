@@ -0,0 +1,293 @@
+"""
+Alert side effects off the frame loop. AlertManager.handle_alert only
+decides whether to alert and queues an AlertEvent; workers here broadcast
+it, write the screenshot and record the sighting, so a slow disk or
+database no longer holds up recognition for every camera.
+"""
+import asyncio
+import json
+import logging
+import os
+from datetime import datetime
+
+from metrics import ALERTS_DROPPED, SIGHTINGS_SPILLED
+from screenshots import has_thumbnail, preview_filename, thumbnail_filename
+from utils import host_address, screenshot_filename
+
+
+def journal_line(row):
+    image, date_recorded, criminal, camera = row
+    return json.dumps([image, date_recorded.isoformat(), criminal, camera]) + "\n"
+
+
+class AlertEvent:
+    """One alert. The screenshot name is fixed up front for the broadcast to link."""
+
+    __slots__ = (
+        "detected_face",
+        "url",
+        "frame",
+        "bbox",
+        "trace",
+        "created",
+        "filename",
+        "thumbnail",
+    )
+
+    def __init__(self, detected_face, url, frame, trace=None, bbox=None):
+        self.detected_face = detected_face
+        self.url = url
+        self.frame = frame
+        self.bbox = bbox  # face box for the thumbnail
+        self.trace = trace
+        self.created = datetime.now()
+        directory = "../media/screenshots/criminals/{}/{}/{}/{}".format(
+            detected_face, *self.created.timetuple()[:3]
+        )
+        self.filename = screenshot_filename(directory, url, self.created)
+        self.thumbnail = has_thumbnail(frame, bbox)
+
+    @property
+    def image_url(self):
+        return host_address + self.filename[2:]
+
+    @property
+    def preview_url(self):
+        return host_address + preview_filename(self.filename)[2:]
+
+    @property
+    def thumbnail_url(self):
+        if not self.thumbnail:
+            return None
+        return host_address + thumbnail_filename(self.filename)[2:]
+
+    def mark(self, stage):
+        if self.trace is not None:
+            self.trace.mark(stage)
+
+
+class AlertPipeline:
+    """
+    Bounded queue of AlertEvents consumed by workers. Each event is
+    broadcast first, then its screenshots are encoded and written on the
+    ScreenshotWriter pool, then its sighting goes to a single writer that inserts
+    everything queued so far in one insert_sightings transaction.
+
+    A batch the database still refuses after retries is appended to the
+    journal (JSON lines) and replayed once writes succeed again.
+    """
+
+    def __init__(
+        self,
+        send_alert,
+        database,
+        screenshots,
+        maxsize=100,
+        workers=2,
+        batch_size=50,
+        retries=3,
+        backoff=0.5,
+        journal_path=None,
+        replay_interval=30,
+        latency=None,
+    ):
+        self.send_alert = send_alert
+        self.database = database  # awaitable get_camera and insert_sightings
+        self.screenshots = screenshots
+        self.events = asyncio.Queue(maxsize)
+        self.sightings = asyncio.Queue()  # (row, trace)
+        self.workers = workers
+        self.batch_size = batch_size
+        self.retries = retries
+        self.backoff = backoff
+        self.journal_path = journal_path
+        self.replay_interval = replay_interval
+        self.latency = latency
+        self.journaled = bool(journal_path) and os.path.exists(journal_path)
+        self.tasks = []
+
+    def start(self):
+        if self.tasks:
+            return
+        self.tasks = [asyncio.create_task(self.worker()) for _ in range(self.workers)]
+        self.tasks.append(asyncio.create_task(self.write_sightings()))
+
+    def submit(self, event):
+        """Queues an event without waiting; False if the queue is full."""
+        try:
+            self.events.put_nowait(event)
+        except asyncio.QueueFull:
+            logging.warning(
+                "Alert queue full, dropped alert for %s on %s",
+                event.detected_face,
+                event.url,
+            )
+            ALERTS_DROPPED.inc()
+            return False
+        return True
+
+    async def join(self):
+        """Waits until every queued alert is delivered and recorded or journaled."""
+        await self.events.join()
+        await self.sightings.join()
+
+    async def worker(self):
+        while True:
+            event = await self.events.get()
+            try:
+                await self.deliver(event)
+            except Exception:
+                logging.exception(
+                    "Alert for %s on %s failed", event.detected_face, event.url
+                )
+            finally:
+                self.events.task_done()
+
+    async def deliver(self, event):
+        captured_at = event.trace.captured_at if event.trace is not None else None
+        try:
+            await self.send_alert(
+                event.detected_face,
+                event.url,
+                path=event.image_url,
+                preview=event.preview_url,
+                thumbnail=event.thumbnail_url,
+                captured_at=captured_at,
+            )
+        except Exception:
+            # The sighting is still worth keeping
+            logging.exception("Broadcasting alert for %s failed", event.detected_face)
+        else:
+            event.mark("delivered")
+            if self.latency is not None and event.trace is not None:
+                self.latency.record(event.trace, "delivered")
+
+        saved = await self.screenshots.save(event.frame, event.filename, event.bbox)
+        event.frame = None
+        if saved is None:
+            return
+        event.mark("screenshot")
+
+        camera = await self.database.get_camera(event.url)
+        row = (
+            event.image_url,
+            event.created,
+            int(event.detected_face),
+            camera.get("id") if camera else None,
+        )
+        self.sightings.put_nowait((row, event.trace))
+
+    async def write_sightings(self):
+        while True:
+            if self.journaled:
+                await self.replay()
+            try:
+                first = await asyncio.wait_for(
+                    self.sightings.get(),
+                    self.replay_interval if self.journaled else None,
+                )
+            except asyncio.TimeoutError:
+                continue
+            batch = [first]
+            while len(batch) < self.batch_size and not self.sightings.empty():
+                batch.append(self.sightings.get_nowait())
+            rows = [row for row, _ in batch]
+            try:
+                if await self.insert(rows):
+                    for _, trace in batch:
+                        if trace is not None:
+                            trace.mark("recorded")
+                else:
+                    await asyncio.to_thread(self.spill, rows)
+            except Exception:
+                logging.exception("Recording %d sightings failed", len(rows))
+            finally:
+                for _ in batch:
+                    self.sightings.task_done()
+
+    async def insert(self, rows):
+        for attempt in range(self.retries + 1):
+            try:
+                await self.database.insert_sightings(rows)
+                return True
+            except Exception as e:
+                logging.warning(
+                    "Writing %d sightings failed (attempt %d of %d): %s",
+                    len(rows),
+                    attempt + 1,
+                    self.retries + 1,
+                    e,
+                )
+            if attempt < self.retries:
+                await asyncio.sleep(self.backoff * 2**attempt)
+        return False
+
+    def spill(self, rows):
+        if not self.journal_path:
+            logging.error("Database unavailable, %d sightings lost", len(rows))
+            return
+        with open(self.journal_path, "a+b") as f:
+            # Start on a fresh line if a crash left the last append torn
+            if f.tell() > 0:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    f.write(b"\n")
+            f.write("".join(journal_line(row) for row in rows).encode())
+        self.journaled = True
+        SIGHTINGS_SPILLED.inc(len(rows))
+        logging.warning("Database unavailable, %d sightings journaled", len(rows))
+
+    def read_journal(self):
+        """Journaled rows; lines that don't parse (e.g. a torn append) are skipped."""
+        if not os.path.exists(self.journal_path):
+            return []
+        rows = []
+        with open(self.journal_path) as f:
+            for number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    image, date_recorded, criminal, camera = json.loads(line)
+                    date_recorded = datetime.fromisoformat(date_recorded)
+                except (ValueError, TypeError) as e:
+                    logging.error(
+                        "Skipping corrupt line %d of %s: %s",
+                        number,
+                        self.journal_path,
+                        e,
+                    )
+                    continue
+                rows.append((image, date_recorded, criminal, camera))
+        return rows
+
+    def rewrite_journal(self, rows):
+        if not rows:
+            if os.path.exists(self.journal_path):
+                os.remove(self.journal_path)
+            return
+        temp_path = self.journal_path + ".tmp"
+        with open(temp_path, "w") as f:
+            f.writelines(journal_line(row) for row in rows)
+        os.replace(temp_path, self.journal_path)
+
+    async def replay(self):
+        """Inserts journaled sightings, one batch per transaction, keeping the rest."""
+        try:
+            rows = await asyncio.to_thread(self.read_journal)
+        except OSError as e:
+            logging.error("Could not read %s: %s", self.journal_path, e)
+            return
+        done = 0
+        try:
+            while done < len(rows):
+                chunk = rows[done : done + self.batch_size]
+                await self.database.insert_sightings(chunk)
+                done += len(chunk)
+        except Exception as e:
+            logging.warning(
+                "Journal replay stopped, %d sightings left: %s", len(rows) - done, e
+            )
+        if done:
+            logging.info("Replayed %d journaled sightings", done)
+        await asyncio.to_thread(self.rewrite_journal, rows[done:])
+        self.journaled = done < len(rows)
@@ -0,0 +1,65 @@
+"""
+Compares per-face gallery search (one faiss call per face) against the
+batched search used by FaceRecognition.match_frames.
+
+Run from the ai/ directory:
+    python -m benchmarks.batch_search --gallery 10000 --faces 1 10 20 40
+"""
+import argparse
+import time
+
+import numpy as np
+
+from gallery import GalleryIndex
+
+
+def synthetic_gallery(size, dim, rng):
+    gallery = GalleryIndex()
+    embeddings = rng.standard_normal((size, dim)).astype(np.float32)
+    gallery.sync({str(i): embeddings[i : i + 1] for i in range(size)})
+    return gallery.snapshot
+
+
+def per_face(snapshot, queries):
+    for embedding in queries:
+        snapshot.index.search(embedding.reshape(1, -1), 1)
+
+
+def batched(snapshot, queries):
+    snapshot.search(queries, 1)
+
+
+def timeit(fn, snapshot, queries, repeat):
+    fn(snapshot, queries)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn(snapshot, queries)
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--gallery", type=int, default=10000)
+    parser.add_argument("--dim", type=int, default=512)
+    parser.add_argument("--faces", type=int, nargs="+", default=[1, 10, 20, 40])
+    parser.add_argument("--frames", type=int, default=1, help="frames per micro-batch")
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    snapshot = synthetic_gallery(args.gallery, args.dim, rng)
+    print(f"gallery={args.gallery} dim={args.dim} frames/batch={args.frames}")
+    print(f"{'faces':>6} {'per-face ms':>12} {'batched ms':>11} {'speedup':>8}")
+    for faces in args.faces:
+        queries = rng.standard_normal((faces * args.frames, args.dim))
+        queries = queries.astype(np.float32)
+        single = timeit(per_face, snapshot, queries, args.repeat)
+        batch = timeit(batched, snapshot, queries, args.repeat)
+        print(
+            f"{faces:>6} {single * 1000:>12.3f} {batch * 1000:>11.3f} "
+            f"{single / batch:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Alerts/sec of the database work behind one alert against a local
+PostgreSQL, before and after connection pooling:
+
+    connect   a new connection per query, queries run one after another on
+              the event loop (get_details, get_camera twice, insert_records,
+              add_temp: how AlertManager used Database before)
+    pooled    AsyncDatabase over the connection pool with --concurrency
+              alerts in flight, the record and temp record written in one
+              insert_sightings transaction
+
+Uses the DB* settings from .env. Rows are inserted into
+api_criminalsrecords and api_temprecords, so point it at a scratch
+database. Run from the ai/ directory:
+    python -m benchmarks.db_alerts --criminal 1 --camera rtsp://10.0.0.5/stream
+"""
+import argparse
+import asyncio
+import contextlib
+import time
+from datetime import datetime
+
+from models import AsyncDatabase, Database
+
+
+class ConnectPerQueryDatabase(Database):
+    """Database as it was before pooling: one connection per query."""
+
+    @contextlib.contextmanager
+    def connection(self):
+        conn = self._db_connect()
+        try:
+            yield conn
+            conn.commit()
+        finally:
+            conn.close()
+
+
+def alert_queries(database, criminal, camera):
+    database.get_details(criminal)
+    database.get_camera(camera)
+    camera_id = database.get_camera(camera)["id"]
+    database.insert_records("benchmark.jpg", datetime.now(), criminal, camera_id)
+    database.add_temp()
+
+
+async def async_alert_queries(database, criminal, camera):
+    await asyncio.gather(database.get_details(criminal), database.get_camera(camera))
+    camera_id = (await database.get_camera(camera))["id"]
+    await database.insert_sightings(
+        [("benchmark.jpg", datetime.now(), criminal, camera_id)]
+    )
+
+
+async def connect_per_query(args):
+    database = ConnectPerQueryDatabase()
+    start = time.perf_counter()
+    for _ in range(args.alerts):
+        alert_queries(database, args.criminal, args.camera)
+    return args.alerts / (time.perf_counter() - start)
+
+
+async def pooled(args):
+    database = AsyncDatabase(Database(maxconn=args.pool_size))
+    remaining = args.alerts
+
+    async def worker():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            await async_alert_queries(database, args.criminal, args.camera)
+
+    # Open the pool before timing
+    await async_alert_queries(database, args.criminal, args.camera)
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    rate = args.alerts / (time.perf_counter() - start)
+    database.close()
+    database.database.close()
+    return rate
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--criminal", type=int, required=True, help="existing id")
+    parser.add_argument("--camera", required=True, help="url of an existing camera")
+    parser.add_argument("--alerts", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--pool-size", type=int, default=8)
+    args = parser.parse_args()
+
+    for name, run in (("connect", connect_per_query), ("pooled", pooled)):
+        rate = asyncio.run(run(args))
+        print(f"{name:>8} {rate:8.1f} alerts/s")
+
+
+if __name__ == "__main__":
+    main()
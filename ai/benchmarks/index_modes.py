@@ -0,0 +1,79 @@
+"""
+Recall@1 (against flat search), query latency, build time and index
+memory for every gallery index mode on synthetic galleries of growing size.
+
+Queries are noisy copies of enrolled embeddings, the way a live probe of
+an enrolled person looks, so recall is measured where it matters.
+
+Run from the ai/ directory:
+    python -m benchmarks.index_modes --sizes 10000 100000 1000000
+"""
+import argparse
+import time
+
+import numpy as np
+import faiss
+
+from gallery import INDEX_MODES, GalleryIndex
+
+
+def synthetic(size, dim, queries, noise, rng):
+    gallery = rng.standard_normal((size, dim)).astype(np.float32)
+    picked = rng.integers(0, size, queries)
+    probes = gallery[picked] + noise * rng.standard_normal((queries, dim))
+    return gallery, probes.astype(np.float32)
+
+
+def run_mode(mode, gallery, probes, args):
+    index = GalleryIndex(
+        mode=mode, nprobe=args.nprobe, ef_search=args.ef_search, pq_m=args.pq_m
+    )
+    start = time.perf_counter()
+    index.sync({str(i): gallery[i : i + 1] for i in range(len(gallery))})
+    build = time.perf_counter() - start
+    snapshot = index.snapshot
+    snapshot.search(probes[:10], 1)
+    start = time.perf_counter()
+    _, labels = snapshot.search(probes, 1)
+    latency = (time.perf_counter() - start) / len(probes)
+    memory = faiss.serialize_index(snapshot.index).nbytes
+    return index.active_mode, [row[0] for row in labels], build, latency, memory
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--modes", nargs="+", default=list(INDEX_MODES))
+    parser.add_argument("--dim", type=int, default=512)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--noise", type=float, default=0.3)
+    parser.add_argument("--nprobe", type=int, default=16)
+    parser.add_argument("--ef-search", type=int, default=64)
+    parser.add_argument("--pq-m", type=int, default=64)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(
+        f"{'size':>8} {'mode':>9} {'active':>9} {'recall@1':>9} "
+        f"{'ms/query':>9} {'build s':>8} {'MiB':>8}"
+    )
+    for size in args.sizes:
+        gallery, probes = synthetic(size, args.dim, args.queries, args.noise, rng)
+        truth = None
+        for mode in ["flat"] + [m for m in args.modes if m != "flat"]:
+            active, labels, build, latency, memory = run_mode(
+                mode, gallery, probes, args
+            )
+            if truth is None:
+                truth = labels
+            recall = np.mean([a == b for a, b in zip(labels, truth)])
+            if mode == "flat" and "flat" not in args.modes:
+                continue
+            print(
+                f"{size:>8} {mode:>9} {active:>9} {recall:>9.3f} "
+                f"{latency * 1000:>9.3f} {build:>8.2f} {memory / 2**20:>8.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
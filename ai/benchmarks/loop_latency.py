@@ -0,0 +1,91 @@
+"""
+End-to-end websocket round-trip latency while the server is busy with
+inference, with the model called inline on the event loop (the old
+process_frames) versus through InferenceExecutor.
+
+A synthetic CPU-bound model (numpy matmuls, which release the GIL like
+onnxruntime does) stands in for face_model.get, so this runs without
+insightface or cameras.
+
+Run from the ai/ directory:
+    python -m benchmarks.loop_latency --seconds 10
+"""
+import argparse
+import asyncio
+import time
+
+import numpy as np
+import websockets
+
+from inference import InferenceExecutor
+
+
+def fake_model(frame):
+    for _ in range(8):
+        frame = np.tanh(frame @ frame)
+    return frame
+
+
+async def echo(websocket, *args):
+    async for message in websocket:
+        await websocket.send(message)
+
+
+async def inference_load(mode, executor, frame, stop):
+    while not stop.is_set():
+        if mode == "inline":
+            fake_model(frame)
+            await asyncio.sleep(0)
+        else:
+            await asyncio.gather(*(executor.run(fake_model, frame) for _ in range(2)))
+
+
+async def measure(mode, args):
+    frame = np.random.default_rng(0).standard_normal((args.size, args.size))
+    frame = frame.astype(np.float32) / args.size
+    executor = InferenceExecutor(args.workers)
+    stop = asyncio.Event()
+    server = await websockets.serve(echo, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    rtts = []
+    async with websockets.connect(f"ws://127.0.0.1:{port}") as client:
+        load = asyncio.create_task(inference_load(mode, executor, frame, stop))
+        end = time.monotonic() + args.seconds
+        while time.monotonic() < end:
+            start = time.perf_counter()
+            await client.send("ping")
+            await client.recv()
+            rtts.append(time.perf_counter() - start)
+            await asyncio.sleep(0.01)
+        stop.set()
+        await load
+    server.close()
+    executor.shutdown()
+    return np.array(rtts) * 1000
+
+
+async def measure_idle(args):
+    idle = argparse.Namespace(**vars(args))
+    idle.size = 1
+    return await measure("executor", idle)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--size", type=int, default=300, help="fake model matrix size")
+    parser.add_argument("--workers", type=int, default=1)
+    args = parser.parse_args()
+
+    print(f"{'mode':>9} {'pings':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for mode in ("idle", "inline", "executor"):
+        if mode == "idle":
+            rtts = asyncio.run(measure_idle(args))
+        else:
+            rtts = asyncio.run(measure(mode, args))
+        p50, p95, p99 = np.percentile(rtts, [50, 95, 99])
+        print(f"{mode:>9} {len(rtts):>6} {p50:>8.2f} {p95:>8.2f} {p99:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
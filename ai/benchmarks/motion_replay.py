@@ -0,0 +1,69 @@
+"""
+Replays a recording through MotionGate and reports how many frames would
+skip face detection and the CPU that saves.
+
+The detector cost per frame is measured with insightface when --detect is
+given, otherwise taken from --detect-ms.
+
+Run from the ai/ directory:
+    python -m benchmarks.motion_replay /data/night_aisle.mp4 --fps 10
+"""
+import argparse
+import time
+
+from benchmarks.sources import iter_frames
+from motion import MotionGate
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("source", help="video file or directory of frames")
+    parser.add_argument("--sensitivity", type=float, default=0.002)
+    parser.add_argument("--pixel-delta", type=int, default=25)
+    parser.add_argument("--max-skip", type=float, default=5.0)
+    parser.add_argument("--fps", type=float, default=10, help="recorded frame rate")
+    parser.add_argument("--limit", type=int, default=None)
+    parser.add_argument("--detect", action="store_true", help="time real detection")
+    parser.add_argument("--detect-ms", type=float, default=100.0)
+    args = parser.parse_args()
+
+    gate = MotionGate(args.sensitivity, args.pixel_delta, max_skip=args.max_skip)
+    face_model = None
+    if args.detect:
+        from train import detect_faces, load_face_model
+
+        face_model = load_face_model()
+
+    frames = forwarded = 0
+    gate_seconds = detect_seconds = 0.0
+    for frame in iter_frames(args.source, args.limit):
+        # Replay on the recorded clock so max_skip behaves as it would live
+        recorded_at = frames / args.fps
+        frames += 1
+        start = time.perf_counter()
+        accepted = gate.accept("replay", frame, now=recorded_at)
+        gate_seconds += time.perf_counter() - start
+        if accepted:
+            forwarded += 1
+            if face_model is not None:
+                start = time.perf_counter()
+                detect_faces(face_model, frame)
+                detect_seconds += time.perf_counter() - start
+
+    if frames == 0:
+        print("No frames read")
+        return
+    detect_ms = detect_seconds / forwarded * 1000 if face_model else args.detect_ms
+    gate_ms = gate_seconds / frames * 1000
+    skipped = frames - forwarded
+    saved = skipped * detect_ms - frames * gate_ms
+    print(f"frames={frames} forwarded={forwarded} skipped={skipped / frames:.1%}")
+    print(f"gate cost {gate_ms:.2f} ms/frame, detection {detect_ms:.1f} ms/frame")
+    print(
+        f"CPU saved {saved / 1000:.1f}s of {frames * detect_ms / 1000:.1f}s "
+        f"({saved / (frames * detect_ms):.1%})"
+    )
+
+
+if __name__ == "__main__":
+    main()
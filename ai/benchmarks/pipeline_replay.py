@@ -0,0 +1,214 @@
+"""
+Replays recorded video files or image directories through the MainStream
+pipeline (motion gate, detection, quality gate, tracking, embedding, search,
+confirmation, alerts) without cameras or PostgreSQL, and reports frames/sec,
+per-stage latency percentiles, CPU use and peak RSS.
+
+Every source is one camera. Frames are fed one per camera per round and
+each round is processed before the next is read, so nothing is dropped and
+runs are comparable; the sampling scheduler is bypassed. The pipeline clock
+follows the recorded frame rate. Alerts go to an in-memory database and a
+websocket sink that discards messages; screenshots are written to a
+temporary directory.
+
+The gallery uses the media/criminals layout (one directory per numeric
+criminal id). Run from the ai/ directory:
+    python -m benchmarks.pipeline_replay /data/entrance.mp4 /data/lobby --fps 10
+"""
+import argparse
+import asyncio
+import os
+import resource
+import tempfile
+import time
+
+from benchmarks.sources import iter_frames
+from monitoring import StageTimer
+from tracing import FrameTrace
+from server import MainStream
+
+STAGES = ("decode", "detect", "embed", "search", "alert", "deliver", "record")
+
+
+class MemoryDatabase:
+    """Answers the queries MainStream and AlertManager make, without PostgreSQL."""
+
+    def __init__(self, urls):
+        self.cameras = {
+            url: {
+                "id": i,
+                "name": f"replay {i}",
+                "url": url,
+                "longitude": 0.0,
+                "latitude": 0.0,
+                "image": "cameras/replay.jpg",
+            }
+            for i, url in enumerate(urls, 1)
+        }
+        self.records = []
+        self.temp_records = []
+
+    def get_details(self, criminal_id):
+        return {
+            "id": int(criminal_id),
+            "first_name": "replay",
+            "last_name": str(criminal_id),
+            "age": 0,
+            "description": "",
+            "date_created": "",
+            "middle_name": "",
+        }
+
+    def get_camera(self, url):
+        return dict(self.cameras[url])
+
+    def get_camera_urls(self):
+        return list(self.cameras)
+
+    def get_by_similar(self, partial_url):
+        for url, camera in self.cameras.items():
+            if partial_url in url:
+                return dict(camera)
+        return {}
+
+    def insert_records(self, image, date_recorded, criminal, camera):
+        self.records.append((image, date_recorded, criminal, camera))
+
+    def add_temp(self):
+        self.temp_records.append(len(self.records))
+        return len(self.records)
+
+    def insert_sightings(self, sightings):
+        ids = []
+        for sighting in sightings:
+            self.insert_records(*sighting)
+            ids.append(self.add_temp())
+        return ids
+
+
+class NullWebSocket:
+    open = True
+
+    def __init__(self):
+        self.sent = 0
+
+    async def send(self, message):
+        self.sent += 1
+
+
+def time_pipeline(pipeline, stages):
+    """
+    Times the work the alert pipeline does off the frame loop: "deliver"
+    (broadcast, screenshots) per alert and "record" per sighting batch.
+    The "alert" stage only covers the decision and the queue submit.
+    """
+    deliver, insert = pipeline.deliver, pipeline.insert
+    pipeline.deliver = lambda event: stages.timed("deliver", deliver(event))
+    pipeline.insert = lambda rows: stages.timed("record", insert(rows))
+
+
+async def replay(stream, urls, sources, args):
+    # The process pool needs the running loop, so it starts here
+    if stream.worker_pool is not None:
+        stream.worker_pool.start(stream.gallery)
+    try:
+        return await replay_frames(stream, urls, sources, args)
+    finally:
+        if stream.worker_pool is not None:
+            stream.worker_pool.shutdown()
+
+
+async def replay_frames(stream, urls, sources, args):
+    readers = {
+        url: iter_frames(source, args.limit) for url, source in zip(urls, sources)
+    }
+    time_pipeline(stream.alert_manager.pipeline, stream.stages)
+    stream.alert_manager.pipeline.start()
+    frames = 0
+    rounds = 0
+    while readers:
+        recorded_at = rounds / args.fps
+        rounds += 1
+        for url, reader in list(readers.items()):
+            start = time.perf_counter()
+            frame = next(reader, None)
+            if frame is None:
+                del readers[url]
+                continue
+            stream.stages.observe("decode", time.perf_counter() - start)
+            frames += 1
+            trace = FrameTrace(url)
+            if stream.motion_gate is None or stream.motion_gate.accept(
+                url, frame, now=recorded_at
+            ):
+                stream.processing_queue.put(url, frame, trace)
+        while not stream.processing_queue.empty():
+            batch, traces = stream.next_batch(stream.processing_queue.get_nowait())
+            await stream.process_batch(batch, now=recorded_at, traces=traces)
+    await stream.alert_manager.pipeline.join()
+    return frames
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("sources", nargs="+", help="video files or image directories")
+    parser.add_argument("--gallery", default="../media/criminals")
+    parser.add_argument("--fps", type=float, default=10, help="recorded frame rate")
+    parser.add_argument("--limit", type=int, default=None, help="frames per source")
+    parser.add_argument("--batch-size", type=int, default=8)
+    args = parser.parse_args()
+
+    urls = [
+        f"rtsp://replay-{i}/{os.path.basename(source)}"
+        for i, source in enumerate(args.sources, 1)
+    ]
+    database = MemoryDatabase(urls)
+    stream = MainStream(
+        os.path.abspath(args.gallery), urls, args.batch_size, database=database
+    )
+    stream.stages = StageTimer(window=None)  # percentiles over the whole run
+    sink = NullWebSocket()
+    stream.websocket_manager.web_clients.add(sink)
+    # Screenshot paths are relative ("../media/..."), keep them out of the repo
+    workdir = tempfile.mkdtemp(prefix="pipeline_replay_")
+    os.makedirs(os.path.join(workdir, "ai"))
+    os.chdir(os.path.join(workdir, "ai"))
+
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    start = time.perf_counter()
+    frames = asyncio.run(replay(stream, urls, args.sources, args))
+    elapsed = time.perf_counter() - start
+    cpu = 0.0
+    peak_kb = 0
+    for who in (resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN):
+        end = resource.getrusage(who)
+        cpu += end.ru_utime + end.ru_stime
+        peak_kb = max(peak_kb, end.ru_maxrss)
+    cpu -= usage.ru_utime + usage.ru_stime
+
+    if frames == 0:
+        print("No frames read")
+        return
+    print(
+        f"{frames} frames from {len(urls)} sources in {elapsed:.1f}s: "
+        f"{frames / elapsed:.1f} frames/s"
+    )
+    print(
+        f"CPU {cpu:.1f}s ({cpu / elapsed:.0%} of one core), "
+        f"peak RSS {peak_kb / 1024:.0f} MiB"
+    )
+    print(
+        f"alerts {len(database.records)}, websocket messages {sink.sent}, "
+        f"screenshots in {workdir}"
+    )
+    print(f"{'stage':>7} {'count':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for stage in STAGES:
+        p = stream.stages.percentiles(stage)
+        print(
+            f"{stage:>7} {stream.stages.counts.get(stage, 0):>7} "
+            f"{p[50] * 1000:>8.1f} {p[95] * 1000:>8.1f} {p[99] * 1000:>8.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Compares the fp32 insightface models with the INT8 ones written by
+quantize.py on a labelled image set (one directory per person, like
+media/criminals): embedding cosine between the two, leave-one-out top-1
+gallery matches, and time per image.
+
+Run from the ai/ directory:
+    python -m benchmarks.quantized_accuracy /data/labelled --modules recognition
+"""
+import argparse
+import os
+import time
+
+import cv2
+import numpy as np
+
+from gallery import normalize
+from settings import face_model_options
+from train import load_face_model
+
+
+def labelled_images(directory):
+    for identity in sorted(os.listdir(directory)):
+        person_dir = os.path.join(directory, identity)
+        if not os.path.isdir(person_dir):
+            continue
+        for name in sorted(os.listdir(person_dir)):
+            if name.endswith((".jpg", ".png")):
+                yield identity, os.path.join(person_dir, name)
+
+
+def embed(face_model, image):
+    """First face embedding, the way FaceTrainer.compute_embedding enrolls."""
+    start = time.perf_counter()
+    faces = face_model.get(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
+    elapsed = time.perf_counter() - start
+    return (faces[0].embedding if faces else None), elapsed
+
+
+def top1(embeddings, labels):
+    """Label of each image's nearest other image."""
+    scores = embeddings @ embeddings.T
+    np.fill_diagonal(scores, -np.inf)
+    return labels[scores.argmax(axis=1)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("images", help="directory with one sub-directory per person")
+    parser.add_argument(
+        "--modules",
+        nargs="+",
+        default=["recognition"],
+        choices=["recognition", "detection"],
+        help="modules to load quantized",
+    )
+    args = parser.parse_args()
+
+    options = face_model_options()
+    fp32_model = load_face_model(dict(options, quantized=[]))
+    int8_model = load_face_model(dict(options, quantized=args.modules))
+
+    labels, fp32, int8 = [], [], []
+    fp32_seconds = int8_seconds = 0.0
+    images = missed = 0
+    for identity, path in labelled_images(args.images):
+        image = cv2.imread(path)
+        if image is None:
+            continue
+        images += 1
+        fp32_embedding, elapsed = embed(fp32_model, image)
+        fp32_seconds += elapsed
+        int8_embedding, elapsed = embed(int8_model, image)
+        int8_seconds += elapsed
+        if fp32_embedding is None or int8_embedding is None:
+            # Only possible when detection is quantized too
+            missed += fp32_embedding is not None or int8_embedding is not None
+            continue
+        labels.append(identity)
+        fp32.append(fp32_embedding)
+        int8.append(int8_embedding)
+
+    if len(labels) < 2:
+        print("Need at least two images with a detected face")
+        return
+    labels = np.array(labels)
+    fp32 = normalize(np.stack(fp32))
+    int8 = normalize(np.stack(int8))
+    cosine = (fp32 * int8).sum(axis=1)
+    fp32_top1 = top1(fp32, labels)
+    int8_top1 = top1(int8, labels)
+
+    print(f"{images} images, {len(labels)} with faces in both, {missed} in one only")
+    print(
+        f"fp32 vs int8 cosine: mean {cosine.mean():.4f} "
+        f"p5 {np.percentile(cosine, 5):.4f} min {cosine.min():.4f}"
+    )
+    print(f"{'model':>5} {'top-1 acc':>10} {'ms/image':>9}")
+    for name, matches, seconds in (
+        ("fp32", fp32_top1, fp32_seconds),
+        ("int8", int8_top1, int8_seconds),
+    ):
+        accuracy = (matches == labels).mean()
+        print(f"{name:>5} {accuracy:>10.2%} {seconds / images * 1000:>9.1f}")
+    print(f"top-1 agreement: {(fp32_top1 == int8_top1).mean():.2%}")
+
+
+if __name__ == "__main__":
+    main()
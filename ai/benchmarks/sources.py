@@ -0,0 +1,28 @@
+import os
+
+import cv2
+
+
+def iter_frames(source, limit=None):
+    """Yields BGR frames from a video file or a directory of images (sorted by name)."""
+    count = 0
+    if os.path.isdir(source):
+        for name in sorted(os.listdir(source)):
+            if limit is not None and count >= limit:
+                return
+            if name.lower().endswith((".jpg", ".jpeg", ".png")):
+                frame = cv2.imread(os.path.join(source, name))
+                if frame is not None:
+                    count += 1
+                    yield frame
+        return
+    capture = cv2.VideoCapture(source)
+    try:
+        while limit is None or count < limit:
+            grabbed, frame = capture.read()
+            if not grabbed:
+                return
+            count += 1
+            yield frame
+    finally:
+        capture.release()
@@ -0,0 +1,99 @@
+"""
+Frames/sec through InferenceWorkerPool for a growing number of worker
+processes, to check that throughput scales with cores.
+
+By default each worker runs a synthetic single-threaded CPU model so the
+script runs anywhere; pass --real to load insightface in every worker
+(optionally with --image for a representative frame).
+
+Run from the ai/ directory:
+    python -m benchmarks.worker_scaling --workers 1 2 4 8 --frames 400
+"""
+import argparse
+import asyncio
+import os
+import time
+
+import numpy as np
+
+from worker_pool import InferenceWorkerPool
+
+
+class SyntheticModel:
+    """Stands in for FaceAnalysis: fixed CPU cost per frame, a few faces out."""
+
+    def __init__(self, faces=3, dim=512):
+        self.faces = faces
+        self.dim = dim
+        self.rng = np.random.default_rng(os.getpid())
+
+    def get(self, frame):
+        small = frame[::4, ::4].astype(np.float32) / 255
+        for _ in range(40):
+            small = np.sqrt(small * 0.5 + 0.25)
+        return [
+            FakeFace(np.array([0, 0, 10, 10]), self.rng.standard_normal(self.dim))
+            for _ in range(self.faces)
+        ]
+
+
+class FakeFace:
+    def __init__(self, bbox, embedding):
+        self.bbox = bbox
+        self.embedding = embedding
+
+
+async def throughput(workers, frame, frames, model_factory):
+    pool = InferenceWorkerPool(workers, model_factory=model_factory)
+    pool.start()
+    try:
+        await asyncio.gather(*(pool.infer(frame) for _ in range(pool.slots)))
+        start = time.perf_counter()
+        sent = 0
+
+        async def feeder():
+            nonlocal sent
+            while sent < frames:
+                sent += 1
+                await pool.infer(frame)
+
+        await asyncio.gather(*(feeder() for _ in range(pool.slots)))
+        return frames / (time.perf_counter() - start)
+    finally:
+        pool.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--workers", type=int, nargs="+", default=None)
+    parser.add_argument("--frames", type=int, default=200)
+    parser.add_argument("--real", action="store_true", help="use insightface")
+    parser.add_argument("--image", help="frame to replay (defaults to random noise)")
+    args = parser.parse_args()
+
+    # One compute thread per worker process, so workers map onto cores.
+    for var in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ[var] = "1"
+    cores = os.cpu_count() or 1
+    workers = args.workers or sorted({1, 2, 4, cores // 2 or 1, cores})
+    if args.image:
+        import cv2
+
+        frame = cv2.imread(args.image)
+    else:
+        frame = np.random.default_rng(0).integers(0, 255, (1080, 1920, 3), np.uint8)
+    factory = "benchmarks.worker_scaling:SyntheticModel"
+    if args.real:
+        factory = "train:load_face_model"
+
+    print(f"cores={cores} frame={frame.shape} frames={args.frames}")
+    print(f"{'workers':>8} {'fps':>8} {'speedup':>8} {'efficiency':>10}")
+    base = None
+    for n in workers:
+        fps = asyncio.run(throughput(n, frame, args.frames, factory))
+        base = base or fps
+        print(f"{n:>8} {fps:>8.1f} {fps / base:>7.2f}x {fps / base / n:>10.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Sweeps the cosine similarity threshold over a labelled image set and
+reports false accept / false reject rates, so SIMILARITY_THRESHOLD can be
+picked per deployment instead of guessed.
+
+The image set uses the same layout as media/criminals, one directory per
+person:
+    python calibrate.py /data/labelled --target-far 0.001
+"""
+import argparse
+
+import numpy as np
+
+from gallery import normalize
+
+
+def pair_scores(encodings):
+    """Cosine scores of all genuine (same person) and impostor image pairs."""
+    labels, embeddings = [], []
+    for identity, rows in encodings.items():
+        labels.extend([identity] * len(rows))
+        embeddings.append(normalize(rows))
+    embeddings = np.concatenate(embeddings)
+    labels = np.array(labels)
+    scores = embeddings @ embeddings.T
+    upper = np.triu_indices(len(labels), k=1)
+    same = labels[upper[0]] == labels[upper[1]]
+    pairs = scores[upper]
+    return pairs[same], pairs[~same]
+
+
+def sweep(genuine, impostor, thresholds):
+    """Returns (threshold, FAR, FRR) for every threshold."""
+    genuine = np.sort(genuine)
+    impostor = np.sort(impostor)
+    results = []
+    for threshold in thresholds:
+        far = 1 - np.searchsorted(impostor, threshold) / max(len(impostor), 1)
+        frr = np.searchsorted(genuine, threshold) / max(len(genuine), 1)
+        results.append((float(threshold), float(far), float(frr)))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("images", help="directory with one sub-directory per person")
+    parser.add_argument("--start", type=float, default=0.0)
+    parser.add_argument("--stop", type=float, default=1.0)
+    parser.add_argument("--step", type=float, default=0.05)
+    parser.add_argument("--target-far", type=float, default=0.001)
+    args = parser.parse_args()
+
+    from train import FaceTrainer
+
+    # Default cache path, so a quantized recognizer is calibrated on its own
+    # embeddings
+    trainer = FaceTrainer(args.images)
+    genuine, impostor = pair_scores(trainer.load_face_encodings(args.images))
+    print(f"{len(genuine)} genuine pairs, {len(impostor)} impostor pairs")
+    if len(genuine) == 0 or len(impostor) == 0:
+        print("Need at least two people and two images of one person.")
+        return
+
+    thresholds = np.arange(args.start, args.stop + args.step / 2, args.step)
+    print(f"{'threshold':>9} {'FAR':>8} {'FRR':>8}")
+    for threshold, far, frr in sweep(genuine, impostor, thresholds):
+        print(f"{threshold:>9.2f} {far:>8.4f} {frr:>8.4f}")
+
+    fine = sweep(genuine, impostor, np.linspace(-1, 1, 2001))
+    eer = min(fine, key=lambda row: abs(row[1] - row[2]))
+    print(f"EER ~{(eer[1] + eer[2]) / 2:.4f} at threshold {eer[0]:.3f}")
+    allowed = [row for row in fine if row[1] <= args.target_far]
+    if allowed:
+        threshold, far, frr = allowed[0]
+        print(
+            f"SIMILARITY_THRESHOLD={threshold:.3f} gives FAR {far:.4f} "
+            f"(target {args.target_far}) with FRR {frr:.4f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+import asyncio
+import logging
+import time
+
+from imutils.video import VideoStream
+
+from metrics import FRAMES_CAPTURED, camera_label
+from tracing import FrameTrace
+
+CONNECTING = "connecting"
+LIVE = "live"
+STALLED = "stalled"
+FAILED = "failed"
+
+
+class CameraSupervisor:
+    """
+    Keeps exactly one capture task per camera in the api_camera table.
+    The table is re-read periodically and streams are started or stopped
+    to match it; a camera with no new frame for stall_timeout seconds is
+    reconnected with exponential backoff. An optional motion gate drops
+    static frames before they reach the frame queue, and an optional
+    sampling scheduler sets how often each camera is sampled.
+    """
+
+    def __init__(
+        self,
+        database,
+        frame_queue,
+        capture_interval=0.1,
+        stall_timeout=10,
+        max_backoff=60,
+        max_failures=5,
+        refresh_interval=60,
+        motion_gate=None,
+        scheduler=None,
+    ):
+        self.database = database
+        self.frame_queue = frame_queue
+        self.motion_gate = motion_gate
+        self.scheduler = scheduler
+        self.capture_interval = capture_interval
+        self.stall_timeout = stall_timeout
+        self.max_backoff = max_backoff
+        self.max_failures = max_failures
+        self.refresh_interval = refresh_interval
+        self.tasks = {}  # url -> capture task
+        self.cameras = {}  # url -> state dict
+
+    async def run(self, urls=None):
+        loop = asyncio.get_running_loop()
+        if urls is not None:
+            self.sync(urls)
+        while True:
+            urls = await loop.run_in_executor(None, self.database.get_camera_urls)
+            if urls is None:
+                # Keep the current cameras through a database outage
+                logging.warning("Could not read cameras, keeping the current ones")
+            else:
+                self.sync(urls)
+            await asyncio.sleep(self.refresh_interval)
+
+    def sync(self, urls):
+        """Starts captures for new cameras and stops removed ones."""
+        urls = set(urls)
+        for url in set(self.tasks) - urls:
+            self.tasks.pop(url).cancel()
+            self.cameras.pop(url, None)
+            self.frame_queue.discard(url)
+            if self.motion_gate is not None:
+                self.motion_gate.discard(url)
+            if self.scheduler is not None:
+                self.scheduler.discard(url)
+            logging.info("Camera %s removed", url)
+        for url in urls - set(self.tasks):
+            self.cameras[url] = {
+                "state": CONNECTING,
+                "since": time.time(),
+                "reconnects": 0,
+                "failures": 0,
+                "last_frame": None,
+            }
+            self.tasks[url] = asyncio.create_task(self.capture(url))
+            logging.info("Camera %s added", url)
+
+    def set_state(self, url, state):
+        camera = self.cameras[url]
+        if camera["state"] != state:
+            logging.info("Camera %s: %s -> %s", url, camera["state"], state)
+            camera["state"] = state
+            camera["since"] = time.time()
+
+    def states(self):
+        """Per-camera state, reconnect count and seconds since the last frame."""
+        now = time.time()
+        return {
+            url: {
+                "state": camera["state"],
+                "since": camera["since"],
+                "reconnects": camera["reconnects"],
+                "last_frame_age": (
+                    now - camera["last_frame"] if camera["last_frame"] else None
+                ),
+            }
+            for url, camera in self.cameras.items()
+        }
+
+    async def capture(self, url):
+        """Captures frames from one camera into the frame queue, reconnecting on stalls."""
+        loop = asyncio.get_running_loop()
+        camera = self.cameras[url]
+        backoff = 1
+        while True:
+            self.set_state(url, CONNECTING)
+            # Opening an RTSP stream blocks for seconds on unreachable hosts
+            stream = await loop.run_in_executor(None, VideoStream, url)
+            try:
+                if stream.stream.stream.isOpened():
+                    await self.read_frames(url, stream.start())
+                    if self.cameras[url]["failures"] == 0:
+                        backoff = 1
+            finally:
+                # Also when sync() cancels a removed camera, or the decode
+                # thread keeps running
+                stream.stop()
+            camera["failures"] += 1
+            camera["reconnects"] += 1
+            if camera["failures"] >= self.max_failures:
+                self.set_state(url, FAILED)
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, self.max_backoff)
+
+    async def read_frames(self, url, stream):
+        camera = self.cameras[url]
+        last_frame = None
+        last_change = time.monotonic()
+        while True:
+            frame = stream.read()
+            now = time.monotonic()
+            # VideoStream.read returns the same object until a new frame is decoded
+            if frame is not None and frame is not last_frame:
+                FRAMES_CAPTURED.labels(camera_label(url)).inc()
+                trace = FrameTrace(url)
+                if self.motion_gate is None or self.motion_gate.accept(url, frame):
+                    self.frame_queue.put(url, frame, trace)
+                if (
+                    self.scheduler is not None
+                    and self.motion_gate is not None
+                    and self.motion_gate.moving.get(url)
+                ):
+                    self.scheduler.record_activity(url)
+                last_frame = frame
+                last_change = now
+                camera["last_frame"] = time.time()
+                camera["failures"] = 0
+                self.set_state(url, LIVE)
+            elif now - last_change > self.stall_timeout:
+                self.set_state(url, STALLED)
+                return
+            await asyncio.sleep(self.sample_interval(url))
+
+    def sample_interval(self, url):
+        if self.scheduler is None:
+            return self.capture_interval
+        return self.scheduler.interval(url)
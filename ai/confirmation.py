@@ -0,0 +1,43 @@
+import collections
+
+
+class ConfirmationBuffer:
+    """
+    Votes over the last n sampled frames of each face track (or identity,
+    for faces without a track) per camera. An identity is confirmed once it
+    was matched in k of them, so a single noisy match never raises an alert.
+
+    Only frames where the face was actually embedded and matched vote; a
+    track's cached identity between re-embeds would repeat one match.
+    """
+
+    def __init__(self, k=3, n=5, ttl=30.0):
+        self.k = k
+        self.n = n
+        self.ttl = ttl  # seconds before an unseen track's votes are dropped
+        self.votes = {}  # (url, key) -> deque of identities (None = no match)
+        self.updated = {}
+
+    def update(self, url, track_id, identity, now, reidentified=True):
+        """
+        Records one frame's match; True when identity is confirmed. A frame
+        that reused the track's cached identity (reidentified=False) only
+        keeps the track's votes alive.
+        """
+        key = (url, track_id if track_id is not None else identity)
+        if not reidentified:
+            if key in self.updated:
+                self.updated[key] = now
+            return False
+        votes = self.votes.get(key)
+        if votes is None:
+            votes = self.votes[key] = collections.deque(maxlen=self.n)
+        votes.append(identity)
+        self.updated[key] = now
+        return identity is not None and votes.count(identity) >= self.k
+
+    def prune(self, now):
+        for key, updated in list(self.updated.items()):
+            if now - updated > self.ttl:
+                del self.updated[key]
+                del self.votes[key]
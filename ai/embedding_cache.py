@@ -0,0 +1,104 @@
+import hashlib
+import os
+from collections import namedtuple
+
+import numpy as np
+
+CacheEntry = namedtuple("CacheEntry", ["mtime_ns", "size", "digest", "embedding"])
+
+
+class EmbeddingCache:
+    """
+    Persistent map of image path -> face embedding.
+    Entries are validated by mtime/size first and by content hash when
+    the cheap check fails, so only new or changed images hit the model.
+    """
+
+    def __init__(self, cache_path):
+        self.cache_path = cache_path
+        self.entries = {}
+        self.dirty = False
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.cache_path):
+            return
+        try:
+            with np.load(self.cache_path, allow_pickle=False) as data:
+                paths = data["paths"]
+                mtimes = data["mtimes"]
+                sizes = data["sizes"]
+                digests = data["digests"]
+                has_face = data["has_face"]
+                embeddings = data["embeddings"]
+        except Exception as e:
+            print(f"Ignoring unreadable embedding cache {self.cache_path}: {e}")
+            return
+        for i, path in enumerate(paths):
+            embedding = embeddings[i] if has_face[i] else None
+            self.entries[str(path)] = CacheEntry(
+                int(mtimes[i]), int(sizes[i]), str(digests[i]), embedding
+            )
+
+    def save(self):
+        if not self.dirty:
+            return
+        paths = list(self.entries)
+        entries = [self.entries[path] for path in paths]
+        dim = next(
+            (len(e.embedding) for e in entries if e.embedding is not None), 0
+        )
+        embeddings = np.zeros((len(entries), dim), dtype=np.float32)
+        for i, entry in enumerate(entries):
+            if entry.embedding is not None:
+                embeddings[i] = entry.embedding
+        tmp_path = self.cache_path + ".tmp"
+        with open(tmp_path, "wb") as file:
+            np.savez(
+                file,
+                paths=np.array(paths, dtype=str),
+                mtimes=np.array([e.mtime_ns for e in entries], dtype=np.int64),
+                sizes=np.array([e.size for e in entries], dtype=np.int64),
+                digests=np.array([e.digest for e in entries], dtype=str),
+                has_face=np.array([e.embedding is not None for e in entries]),
+                embeddings=embeddings,
+            )
+        os.replace(tmp_path, self.cache_path)
+        self.dirty = False
+
+    @staticmethod
+    def file_digest(path):
+        digest = hashlib.sha1()
+        with open(path, "rb") as file:
+            for chunk in iter(lambda: file.read(1 << 20), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def get_or_compute(self, path, compute):
+        """Returns the cached embedding for path, calling compute(path) on a miss."""
+        stat = os.stat(path)
+        entry = self.entries.get(path)
+        if entry is not None:
+            if entry.mtime_ns == stat.st_mtime_ns and entry.size == stat.st_size:
+                return entry.embedding
+        digest = self.file_digest(path)
+        if entry is not None and entry.digest == digest:
+            self.entries[path] = entry._replace(
+                mtime_ns=stat.st_mtime_ns, size=stat.st_size
+            )
+            self.dirty = True
+            return entry.embedding
+        embedding = compute(path)
+        if embedding is not None:
+            embedding = np.asarray(embedding, dtype=np.float32)
+        self.entries[path] = CacheEntry(
+            stat.st_mtime_ns, stat.st_size, digest, embedding
+        )
+        self.dirty = True
+        return embedding
+
+    def prune(self, existing_paths):
+        """Drops entries for images that no longer exist."""
+        for path in set(self.entries) - set(existing_paths):
+            del self.entries[path]
+            self.dirty = True
@@ -1,12 +1,46 @@
+import numpy as np
+
+
 class FaceRecognition:
-    def __init__(self, main_stream):
-        self.index = main_stream.index
-        self.known_face_names = main_stream.known_face_names
+    def __init__(self, main_stream, threshold=0.45):
+        self.gallery = main_stream.gallery
         self.face_model = main_stream.face_model
+        self.threshold = threshold
+
+    def recognize(self, faces, k=1, snapshot=None):
+        """
+        Batched top-k search for a list of faces (from one or many frames).
+        Returns one list of (criminal id, cosine score) per face, best first.
+        """
+        if snapshot is None:
+            snapshot = self.gallery.snapshot
+        if not faces:
+            return []
+        embeddings = np.stack([face.embedding for face in faces])
+        scores, labels = snapshot.search(embeddings, k)
+        return [
+            [
+                (label, float(score))
+                for label, score in zip(labels[i], scores[i])
+                if label is not None
+            ]
+            for i in range(len(faces))
+        ]
 
-    async def process_face(self, face):
-        embedding = face.embedding
-        similarity, index = self.index.search(embedding.reshape(1, -1), 1)
-        if similarity[0, 0] < 500:
-            return self.known_face_names[index[0, 0]]
-        return None
+    def match_frames(self, frames_faces, snapshot=None):
+        """
+        Identifies the faces of several frames with a single gallery search.
+        Returns, per frame, the criminal id (or None) of each face.
+        """
+        flat = [face for faces in frames_faces for face in faces]
+        matches = []
+        for candidates in self.recognize(flat, k=1, snapshot=snapshot):
+            if candidates and candidates[0][1] >= self.threshold:
+                matches.append(candidates[0][0])
+            else:
+                matches.append(None)
+        results, start = [], 0
+        for faces in frames_faces:
+            results.append(matches[start : start + len(faces)])
+            start += len(faces)
+        return results
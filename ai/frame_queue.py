@@ -0,0 +1,88 @@
+import asyncio
+import time
+from collections import deque
+
+from metrics import QUEUE_AGE, camera_label
+
+
+class LatestFrameQueue:
+    """
+    Bounded per-camera frame slots consumed round-robin across cameras.
+    When a camera's slot is full the oldest frame is dropped, so a slow
+    consumer always sees the newest frames and memory stays bounded.
+    """
+
+    def __init__(self, depth=1, age_window=100):
+        self.depth = depth
+        self.frames = {}  # url -> deque of (frame, enqueued at, trace)
+        self.ready = deque()  # cameras with pending frames, in serving order
+        self.not_empty = asyncio.Event()
+        self.received = {}
+        self.dropped = {}
+        self.ages = {}
+        self.age_window = age_window
+
+    def put(self, url, frame, trace=None):
+        slot = self.frames.get(url)
+        if slot is None:
+            slot = self.frames[url] = deque(maxlen=self.depth)
+            self.received[url] = 0
+            self.dropped[url] = 0
+            self.ages[url] = deque(maxlen=self.age_window)
+        if len(slot) == self.depth:
+            self.dropped[url] += 1
+        elif not slot:
+            self.ready.append(url)
+        if trace is not None:
+            trace.mark("queued")
+        slot.append((frame, time.monotonic(), trace))
+        self.received[url] += 1
+        self.not_empty.set()
+
+    def empty(self):
+        return not self.ready
+
+    def qsize(self):
+        return sum(len(slot) for slot in self.frames.values())
+
+    def get_nowait(self):
+        """Returns (frame, url, trace) from the next camera in round-robin order."""
+        if not self.ready:
+            raise asyncio.QueueEmpty
+        url = self.ready.popleft()
+        slot = self.frames[url]
+        frame, enqueued, trace = slot.popleft()
+        if slot:
+            self.ready.append(url)
+        age = time.monotonic() - enqueued
+        self.ages[url].append(age)
+        QUEUE_AGE.labels(camera_label(url)).observe(age)
+        if trace is not None:
+            trace.mark("dequeued")
+        return frame, url, trace
+
+    async def get(self):
+        while not self.ready:
+            self.not_empty.clear()
+            await self.not_empty.wait()
+        return self.get_nowait()
+
+    def discard(self, url):
+        """Forgets a camera that stopped streaming."""
+        self.frames.pop(url, None)
+        if url in self.ready:
+            self.ready.remove(url)
+
+    def stats(self):
+        """Per-camera counters: frames received, dropped, queued and queue age."""
+        stats = {}
+        for url in self.received:
+            ages = self.ages[url]
+            stats[url] = {
+                "received": self.received[url],
+                "dropped": self.dropped[url],
+                "queued": len(self.frames.get(url, ())),
+                "age_avg": sum(ages) / len(ages) if ages else 0.0,
+                "age_max": max(ages) if ages else 0.0,
+            }
+        return stats
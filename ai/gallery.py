@@ -0,0 +1,234 @@
+import math
+import threading
+
+import numpy as np
+import faiss
+
+INDEX_MODES = ("flat", "ivf_flat", "ivf_pq", "hnsw")
+PQ_MIN_TRAINING = 10000  # below this PQ codebooks are poorly trained
+
+
+def normalize(embeddings):
+    """L2-normalizes rows so inner product equals cosine similarity."""
+    embeddings = np.array(embeddings, dtype=np.float32, ndmin=2)
+    faiss.normalize_L2(embeddings)
+    return embeddings
+
+
+def build_index(mode, train, nlist=None, pq_m=64, hnsw_m=32, ef_construction=200):
+    """
+    Index factory for the gallery, all modes scoring by inner product on
+    normalized embeddings. Returns (index, effective mode); IVF and PQ
+    modes are trained on train and fall back to a simpler mode when the
+    gallery is too small to train them.
+    """
+    if mode not in INDEX_MODES:
+        raise ValueError(f"Unknown index mode {mode!r}, expected one of {INDEX_MODES}")
+    n, dim = train.shape
+    if mode == "ivf_pq" and (n < PQ_MIN_TRAINING or dim % pq_m):
+        mode = "ivf_flat"
+    if mode == "hnsw":
+        hnsw = faiss.IndexHNSWFlat(dim, hnsw_m, faiss.METRIC_INNER_PRODUCT)
+        hnsw.hnsw.efConstruction = ef_construction
+        return faiss.IndexIDMap2(hnsw), mode
+    if mode in ("ivf_flat", "ivf_pq"):
+        if nlist is None:
+            nlist = min(int(4 * math.sqrt(n)), n // 39)
+        if nlist >= 2:
+            quantizer = faiss.IndexFlatIP(dim)
+            metric = faiss.METRIC_INNER_PRODUCT
+            if mode == "ivf_pq":
+                index = faiss.IndexIVFPQ(quantizer, dim, nlist, pq_m, 8, metric)
+            else:
+                index = faiss.IndexIVFFlat(quantizer, dim, nlist, metric)
+            index.train(train)
+            return index, mode
+        mode = "flat"
+    return faiss.IndexIDMap2(faiss.IndexFlatIP(dim)), mode
+
+
+def set_search_params(index, nprobe=None, ef_search=None):
+    """Applies query-time knobs to whatever index build_index returned."""
+    if isinstance(index, faiss.IndexIDMap2):
+        inner = faiss.downcast_index(index.index)
+    else:
+        inner = index
+    if nprobe is not None and isinstance(inner, faiss.IndexIVF):
+        inner.nprobe = nprobe
+    if ef_search is not None and isinstance(inner, faiss.IndexHNSW):
+        inner.hnsw.efSearch = ef_search
+
+
+class GallerySnapshot:
+    """Read-only view of the gallery, safe to search while the next one is built."""
+
+    def __init__(self, index=None, labels=None, version=0):
+        self.index = index
+        self.labels = labels or {}
+        self.version = version
+
+    @property
+    def size(self):
+        return self.index.ntotal if self.index is not None else 0
+
+    def search(self, embeddings, k=1):
+        """
+        Searches all rows of embeddings in one faiss call.
+        Returns (cosine scores, criminal ids), both (n, k), best first;
+        missing neighbours have id None and score -inf.
+        """
+        n = len(embeddings)
+        if n == 0 or self.size == 0:
+            return np.full((n, k), -np.inf, dtype=np.float32), [[None] * k] * n
+        scores, ids = self.index.search(normalize(embeddings), k)
+        scores[ids < 0] = -np.inf
+        labels = [[self.labels.get(int(i)) for i in row] for row in ids]
+        return scores, labels
+
+
+class GalleryIndex:
+    """
+    ID-mapped faiss index of enrolled faces keyed by criminal id.
+    Mutations are applied incrementally under a lock and published as a
+    new GallerySnapshot by swapping a single reference, so readers never
+    see a half-updated index. Listeners receive every change as an
+    (op, criminal id, embeddings) tuple so copies in other processes can
+    follow incrementally. Modes that cannot remove vectors (HNSW) or
+    whose training went stale (IVF after the gallery doubled) are rebuilt
+    from the stored embeddings, never by re-running the model.
+    """
+
+    def __init__(self, mode="flat", nprobe=16, ef_search=64, nlist=None, pq_m=64):
+        self.lock = threading.Lock()
+        self.mode = mode
+        self.active_mode = None
+        self.nprobe = nprobe
+        self.ef_search = ef_search
+        self.nlist = nlist
+        self.pq_m = pq_m
+        self.index = None
+        self.trained_size = 0
+        self.needs_rebuild = True
+        self.embeddings = {}  # criminal id -> (n, dim) float32
+        self.faiss_ids = {}  # criminal id -> faiss ids
+        self.labels = {}  # faiss id -> criminal id
+        self.next_id = 0
+        self.listeners = []
+        self.snapshot = GallerySnapshot()
+
+    def add(self, criminal_id, embeddings):
+        with self.lock:
+            self._add(str(criminal_id), embeddings)
+            self._notify("add", str(criminal_id), embeddings)
+            self._publish()
+
+    def remove(self, criminal_id):
+        with self.lock:
+            if self._remove(str(criminal_id)):
+                self._notify("remove", str(criminal_id))
+                self._publish()
+
+    def replace(self, criminal_id, embeddings):
+        with self.lock:
+            self._remove(str(criminal_id))
+            self._add(str(criminal_id), embeddings)
+            self._notify("replace", str(criminal_id), embeddings)
+            self._publish()
+
+    def encodings(self):
+        """Copy of {criminal id: normalized embeddings}, e.g. to seed a replica."""
+        with self.lock:
+            return dict(self.embeddings)
+
+    def _notify(self, op, criminal_id, embeddings=None):
+        for listener in self.listeners:
+            listener(op, criminal_id, embeddings)
+
+    def sync(self, encodings):
+        """Applies the difference between the gallery and encodings {criminal id: embeddings}."""
+        with self.lock:
+            changed = False
+            for criminal_id in set(self.embeddings) - set(encodings):
+                changed |= self._remove(criminal_id)
+                self._notify("remove", criminal_id)
+            for criminal_id, embeddings in encodings.items():
+                embeddings = normalize(embeddings)
+                current = self.embeddings.get(criminal_id)
+                if current is not None and np.array_equal(current, embeddings):
+                    continue
+                self._remove(criminal_id)
+                self._add(criminal_id, embeddings)
+                self._notify("replace", criminal_id, embeddings)
+                changed = True
+            if changed:
+                self._publish()
+
+    def set_search_params(self, nprobe=None, ef_search=None):
+        """Retunes nprobe/efSearch and republishes without touching the vectors."""
+        with self.lock:
+            if nprobe is not None:
+                self.nprobe = nprobe
+            if ef_search is not None:
+                self.ef_search = ef_search
+            self._publish()
+
+    def _add(self, criminal_id, embeddings):
+        if len(embeddings) == 0:
+            return
+        embeddings = normalize(embeddings)
+        ids = np.arange(self.next_id, self.next_id + len(embeddings), dtype=np.int64)
+        self.next_id += len(embeddings)
+        if not self.needs_rebuild:
+            self.index.add_with_ids(embeddings, ids)
+        if criminal_id in self.embeddings:
+            embeddings = np.concatenate([self.embeddings[criminal_id], embeddings])
+            ids = np.concatenate([self.faiss_ids[criminal_id], ids])
+        self.embeddings[criminal_id] = embeddings
+        self.faiss_ids[criminal_id] = ids
+        for faiss_id in ids:
+            self.labels[int(faiss_id)] = criminal_id
+
+    def _remove(self, criminal_id):
+        ids = self.faiss_ids.pop(criminal_id, None)
+        self.embeddings.pop(criminal_id, None)
+        if ids is None:
+            return False
+        if self.active_mode == "hnsw":
+            self.needs_rebuild = True
+        elif not self.needs_rebuild:
+            self.index.remove_ids(ids)
+        for faiss_id in ids:
+            del self.labels[int(faiss_id)]
+        return True
+
+    def _rebuild(self):
+        self.needs_rebuild = False
+        if not self.embeddings:
+            self.index, self.active_mode, self.trained_size = None, None, 0
+            self.needs_rebuild = True
+            return
+        embeddings = np.concatenate(list(self.embeddings.values()))
+        ids = np.concatenate([self.faiss_ids[c] for c in self.embeddings])
+        self.index, self.active_mode = build_index(
+            self.mode, embeddings, nlist=self.nlist, pq_m=self.pq_m
+        )
+        self.index.add_with_ids(embeddings, ids)
+        self.trained_size = len(embeddings)
+
+    def _is_stale(self):
+        """Trained quantizers (and small-gallery fallbacks) are redone once the gallery doubles."""
+        trained = self.active_mode in ("ivf_flat", "ivf_pq")
+        return (trained or self.active_mode != self.mode) and (
+            len(self.labels) > 2 * self.trained_size
+        )
+
+    def _publish(self):
+        if self.needs_rebuild or self._is_stale():
+            self._rebuild()
+        index = None
+        if self.index is not None:
+            index = faiss.clone_index(self.index)
+            set_search_params(index, self.nprobe, self.ef_search)
+        self.snapshot = GallerySnapshot(
+            index, dict(self.labels), self.snapshot.version + 1
+        )
@@ -0,0 +1,31 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+
+class InferenceExecutor:
+    """
+    Runs blocking model calls on dedicated worker threads so the event loop
+    only orchestrates. At most max_in_flight calls are queued or running;
+    further callers wait on the semaphore instead of piling up frames.
+    """
+
+    def __init__(self, workers=1, max_in_flight=None):
+        self.workers = workers
+        self.max_in_flight = max_in_flight or 2 * workers
+        self.executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="inference"
+        )
+        self.slots = asyncio.Semaphore(self.max_in_flight)
+        self.in_flight = 0
+
+    async def run(self, fn, *args):
+        async with self.slots:
+            self.in_flight += 1
+            try:
+                loop = asyncio.get_running_loop()
+                return await loop.run_in_executor(self.executor, fn, *args)
+            finally:
+                self.in_flight -= 1
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,64 @@
+class MetadataCache:
+    """
+    Read-through cache of api_camera and api_criminals rows in front of an
+    AsyncDatabase. Rows are fetched once and then served from memory until
+    the API announces a change on METADATA_CHANNEL (see invalidate). Other
+    queries pass through to the database unchanged.
+
+    Callers get copies, so they may modify the returned dicts.
+    """
+
+    def __init__(self, database):
+        self.database = database
+        self.cameras = {}  # url -> camera row
+        self.cameras_by_host = {}  # partial url -> camera row
+        self.criminals = {}  # criminal id -> row
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __getattr__(self, name):
+        return getattr(self.database, name)
+
+    async def _read_through(self, cache, key, query):
+        if key in cache:
+            self.hits += 1
+            return dict(cache[key])
+        self.misses += 1
+        version = self.version
+        row = await query(key)
+        # Don't keep a row that may predate an invalidation made meanwhile
+        if row and version == self.version:
+            cache[key] = row
+        return dict(row) if row else row
+
+    async def get_camera(self, url):
+        return await self._read_through(self.cameras, url, self.database.get_camera)
+
+    async def get_by_similar(self, partial_url):
+        return await self._read_through(
+            self.cameras_by_host, partial_url, self.database.get_by_similar
+        )
+
+    async def get_details(self, criminal_id):
+        return await self._read_through(
+            self.criminals, str(criminal_id), self.database.get_details
+        )
+
+    def invalidate(self, kind, pk):
+        """
+        Drops cached rows after a "camera:<pk>" or "criminal:<pk>" notification.
+        Camera rows are looked up by url, so any camera change clears them all.
+        """
+        self.version += 1
+        if kind == "camera":
+            self.cameras.clear()
+            self.cameras_by_host.clear()
+        elif kind == "criminal":
+            self.criminals.pop(str(pk), None)
+
+    def clear(self):
+        self.version += 1
+        self.cameras.clear()
+        self.cameras_by_host.clear()
+        self.criminals.clear()
@@ -0,0 +1,134 @@
+"""
+Prometheus metrics of the recognition server, served on /metrics by
+start_metrics_server. Per-event metrics are updated where the event
+happens; queue depth, camera state and similar gauges are read from the
+running MainStream at scrape time.
+
+Cameras are labelled by camera_label, never by their raw url, which for
+RTSP usually carries the camera's credentials.
+"""
+import functools
+from urllib.parse import urlsplit
+
+from prometheus_client import Counter, Histogram, start_http_server
+from prometheus_client.core import REGISTRY, CounterMetricFamily, GaugeMetricFamily
+
+LATENCY_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+
+FRAMES_CAPTURED = Counter(
+    "face_frames_captured_total", "New frames read from a camera", ["camera"]
+)
+QUEUE_AGE = Histogram(
+    "face_frame_queue_age_seconds",
+    "Time a frame waited in the processing queue",
+    ["camera"],
+    buckets=LATENCY_BUCKETS,
+)
+STAGE_SECONDS = Histogram(
+    "face_stage_seconds",
+    "Latency of a pipeline stage (detect, embed, search, alert)",
+    ["stage"],
+    buckets=LATENCY_BUCKETS,
+)
+FACES_PER_FRAME = Histogram(
+    "face_faces_per_frame",
+    "Faces detected in a processed frame",
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21),
+)
+ALERTS = Counter("face_alerts_total", "Alerts emitted", ["camera"])
+ALERTS_DROPPED = Counter(
+    "face_alerts_dropped_total", "Alerts dropped because the alert queue was full"
+)
+SIGHTINGS_SPILLED = Counter(
+    "face_sightings_journaled_total",
+    "Sightings written to the alert journal while the database was unavailable",
+)
+DB_QUERY_SECONDS = Histogram(
+    "face_db_query_seconds",
+    "Duration of a Database query",
+    ["query"],
+    buckets=LATENCY_BUCKETS,
+)
+FRAME_LATENCY_SECONDS = Histogram(
+    "face_frame_latency_seconds",
+    "Time from frame capture to a pipeline stage (processed, delivered)",
+    ["camera", "stage"],
+    buckets=LATENCY_BUCKETS,
+)
+FRAME_STAGE_SECONDS = Histogram(
+    "face_frame_stage_seconds",
+    "Time a frame spent reaching a stage from the previous one",
+    ["stage"],
+    buckets=LATENCY_BUCKETS,
+)
+WEBSOCKET_SEND_SECONDS = Histogram(
+    "face_websocket_send_seconds",
+    "Duration of one websocket send",
+    buckets=LATENCY_BUCKETS,
+)
+
+
+@functools.lru_cache(maxsize=1024)
+def camera_label(url):
+    """host[:port]/path of a camera url, without user, password or query."""
+    parts = urlsplit(url)
+    if not parts.hostname:
+        return parts.path
+    host = parts.hostname
+    if parts.port:
+        host = f"{host}:{parts.port}"
+    return host + parts.path
+
+
+class PipelineCollector:
+    """Scrape-time gauges read from a MainStream."""
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def collect(self):
+        depth = GaugeMetricFamily(
+            "face_frame_queue_depth", "Frames waiting per camera", labels=["camera"]
+        )
+        dropped = CounterMetricFamily(
+            "face_frames_dropped",
+            "Frames replaced by a newer one before processing",
+            labels=["camera"],
+        )
+        for url, stats in self.stream.processing_queue.stats().items():
+            depth.add_metric([camera_label(url)], stats["queued"])
+            dropped.add_metric([camera_label(url)], stats["dropped"])
+        live = GaugeMetricFamily(
+            "face_camera_state",
+            "1 for the current state of each camera",
+            labels=["camera", "state"],
+        )
+        for url, camera in self.stream.camera_supervisor.states().items():
+            live.add_metric([camera_label(url), camera["state"]], 1)
+        rate = GaugeMetricFamily(
+            "face_sampling_fps", "Sampling rate per camera", labels=["camera"]
+        )
+        for url, fps in self.stream.scheduler.rates.items():
+            rate.add_metric([camera_label(url)], fps)
+        gallery = GaugeMetricFamily("face_gallery_size", "Embeddings in the gallery")
+        gallery.add_metric([], self.stream.gallery.snapshot.size)
+        in_flight = GaugeMetricFamily(
+            "face_inference_in_flight", "Inference calls running or waiting"
+        )
+        in_flight.add_metric([], self.stream.inference.in_flight)
+        pipeline = self.stream.alert_manager.pipeline
+        alerts = GaugeMetricFamily(
+            "face_alert_queue_depth",
+            "Alerts and sightings waiting in the alert pipeline",
+            labels=["queue"],
+        )
+        alerts.add_metric(["events"], pipeline.events.qsize())
+        alerts.add_metric(["sightings"], pipeline.sightings.qsize())
+        yield from (depth, dropped, live, rate, gallery, in_flight, alerts)
+
+
+def start_metrics_server(stream, port, address="127.0.0.1"):
+    REGISTRY.register(PipelineCollector(stream))
+    start_http_server(port, addr=address)
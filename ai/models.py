@@ -1,17 +1,63 @@
+import asyncio
+import contextlib
+import functools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import psycopg2
+import psycopg2.extras
+import psycopg2.pool
 import os
 from dotenv import load_dotenv
 
+from metrics import DB_QUERY_SECONDS
+from settings import DB_HEALTH_CHECK_INTERVAL, DB_POOL_MAX, DB_POOL_MIN
+
 load_dotenv()
 
+ENROLLMENT_CHANNEL = "criminals_enrollment"
+METADATA_CHANNEL = "metadata_changed"
+
+
+def timed_query(method):
+    """Records the duration of a Database method under its name."""
+    histogram = DB_QUERY_SECONDS.labels(method.__name__)
+
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        with histogram.time():
+            return method(*args, **kwargs)
+
+    return wrapper
+
 
 class Database:
-    def __init__(self):
+    """
+    Queries go through a pool of at most maxconn connections, opened on
+    first use. Callers beyond maxconn wait for a free connection, and a
+    connection idle for longer than health_check_interval is checked with
+    SELECT 1 and replaced if the server dropped it.
+    """
+
+    def __init__(
+        self,
+        minconn=DB_POOL_MIN,
+        maxconn=DB_POOL_MAX,
+        health_check_interval=DB_HEALTH_CHECK_INTERVAL,
+    ):
         self.dbname = os.environ.get("DBNAME")
         self.user = os.environ.get("DBUSER")
         self.password = os.environ.get("DBPASSWORD")
         self.host = os.environ.get("DBHOST")
         self.port = os.environ.get("DBPORT")
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.health_check_interval = health_check_interval
+        self.pool = None
+        self.pool_lock = threading.Lock()
+        self.available = threading.BoundedSemaphore(maxconn)
+        self.last_used = {}  # id(connection) -> time.monotonic()
 
     def _db_connect(self):
         return psycopg2.connect(
@@ -22,21 +68,81 @@ class Database:
             port=self.port,
         )
 
+    def _pool(self):
+        with self.pool_lock:
+            if self.pool is None:
+                self.pool = psycopg2.pool.ThreadedConnectionPool(
+                    self.minconn,
+                    self.maxconn,
+                    dbname=self.dbname,
+                    user=self.user,
+                    password=self.password,
+                    host=self.host,
+                    port=self.port,
+                )
+            return self.pool
+
+    def _healthy(self, conn):
+        if conn.closed:
+            return False
+        idle = time.monotonic() - self.last_used.get(id(conn), 0)
+        if idle < self.health_check_interval:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    @contextlib.contextmanager
+    def connection(self):
+        """A pooled connection, committed on success and rolled back on error."""
+        pool = self._pool()
+        with self.available:
+            conn = pool.getconn()
+            if not self._healthy(conn):
+                self.last_used.pop(id(conn), None)
+                pool.putconn(conn, close=True)
+                conn = pool.getconn()
+            try:
+                yield conn
+                conn.commit()
+            except Exception:
+                if not conn.closed:
+                    conn.rollback()
+                raise
+            finally:
+                self.last_used[id(conn)] = time.monotonic()
+                pool.putconn(conn, close=bool(conn.closed))
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.closeall()
+
+    def listen(self, *channels):
+        """Opens a dedicated autocommit connection subscribed to NOTIFY channels."""
+        connection = self._db_connect()
+        connection.set_isolation_level(
+            psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT
+        )
+        cursor = connection.cursor()
+        for channel in channels:
+            cursor.execute(f"LISTEN {channel};")
+        cursor.close()
+        return connection
+
     def _execute_query(self, query, params):
         try:
-            conn = self._db_connect()
-            cursor = conn.cursor()
-            self.cursor = cursor
-            cursor.execute(query, params)
-            result = cursor.fetchall()
-            conn.commit()
-            conn.close()
-            return result
+            with self.connection() as conn, conn.cursor() as cursor:
+                cursor.execute(query, params)
+                return cursor.fetchall()
         except Exception as e:
             print(f"An error occurred: {e}")
-            conn.close()
             return None
 
+    @timed_query
     def get_details(self, employee_id):
         query = "SELECT * FROM api_criminals WHERE id=%s"
         rows = self._execute_query(query, (employee_id,))
@@ -58,6 +164,7 @@ class Database:
                 print(rows)
         return None
 
+    @timed_query
     def get_camera(self, url):
         query = "SELECT * FROM api_camera WHERE url=%s"
         rows = self._execute_query(query, (url,))
@@ -67,41 +174,65 @@ class Database:
             return rows_dict
         return None
 
+    @timed_query
     def get_camera_urls(self):
+        """Camera urls, or None if the query failed (as opposed to no cameras)."""
         query = "SELECT url FROM api_camera"
         rows = self._execute_query(query, ())
-        return [row[0] for row in rows] if rows else []
+        return [row[0] for row in rows] if rows is not None else None
 
+    @timed_query
     def get_encodings(self):
         query = self._execute_query(
             """SELECT criminal_id, encoding FROM api_encodings;""", ()
         )
         return [row[-1] for row in query], [rower[0] for rower in query]
 
+    @timed_query
     def insert_records(self, image, date_recorded, criminal, camera):
-        connection = self._db_connect()
-        cursor = connection.cursor()
-        cursor.execute(
-            """
-            INSERT INTO api_criminalsrecords (image_path, date_recorded, criminal_id, camera_id)
-            VALUES (%s, %s, %s, %s)
-            """,
-            (image, date_recorded, criminal, camera),
-        )
-        connection.commit()
+        with self.connection() as connection, connection.cursor() as cursor:
+            cursor.execute(
+                """
+                INSERT INTO api_criminalsrecords (image_path, date_recorded, criminal_id, camera_id)
+                VALUES (%s, %s, %s, %s)
+                """,
+                (image, date_recorded, criminal, camera),
+            )
 
+    @timed_query
+    def insert_sightings(self, sightings):
+        """
+        Inserts (image, date_recorded, criminal, camera) sightings and their
+        api_temprecords rows in one transaction; returns the record ids.
+        """
+        with self.connection() as connection, connection.cursor() as cursor:
+            ids = psycopg2.extras.execute_values(
+                cursor,
+                """
+                INSERT INTO api_criminalsrecords (image_path, date_recorded, criminal_id, camera_id)
+                VALUES %s RETURNING id
+                """,
+                sightings,
+                fetch=True,
+            )
+            ids = [row[0] for row in ids]
+            psycopg2.extras.execute_values(
+                cursor,
+                "INSERT INTO api_temprecords (record_id) VALUES %s",
+                [(record_id,) for record_id in ids],
+            )
+        return ids
+
+    @timed_query
     def get_by_similar(self, partial_url):
         query = """SELECT * FROM api_camera WHERE url ILIKE %s;"""
-        connection = self._db_connect()
-        cursor = connection.cursor()
 
         # Add '%' wildcard before and after the partial_url to find similar matches
         like_pattern = f"%{partial_url}%"
 
-        cursor.execute(query, (like_pattern,))
-        results = cursor.fetchall()
-        cursor.close()
-        connection.close()
+        with self.connection() as connection, connection.cursor() as cursor:
+            cursor.execute(query, (like_pattern,))
+            results = cursor.fetchall()
         keys = ["id", "name", "url", "longitude", "latitude", "image"]
         if results:
             results = results[0]
@@ -110,6 +241,7 @@ class Database:
 
         return context
 
+    @timed_query
     def add_temp(self):
         last_created_record = self._execute_query(
             """SELECT * FROM api_criminalsrecords ORDER BY id DESC LIMIT 1;""",
@@ -117,15 +249,14 @@ class Database:
         )
         if last_created_record:
             last_created_record = last_created_record[0][0]
-        conn = self._db_connect()
-        cursor = conn.cursor()
-        cursor.execute(
-            """INSERT INTO api_temprecords (record_id) VALUES (%s);""",
-            (last_created_record,),
-        )
-        conn.commit()
+        with self.connection() as conn, conn.cursor() as cursor:
+            cursor.execute(
+                """INSERT INTO api_temprecords (record_id) VALUES (%s);""",
+                (last_created_record,),
+            )
         return last_created_record
 
+    @timed_query
     def is_authenticated(self, token):
         token = self._execute_query(
             """SElECT user_id FROM authtoken_token WHERE key=%s;""", (token,)
@@ -135,6 +266,49 @@ class Database:
         return False
 
 
+class AsyncDatabase:
+    """
+    asyncio interface to a Database: every query method is awaitable and
+    runs on one of maxconn threads, so the event loop never blocks on
+    PostgreSQL and no more queries run than there are pooled connections.
+    """
+
+    QUERIES = (
+        "get_details",
+        "get_camera",
+        "get_camera_urls",
+        "get_encodings",
+        "insert_records",
+        "insert_sightings",
+        "get_by_similar",
+        "add_temp",
+        "is_authenticated",
+    )
+
+    def __init__(self, database=None):
+        self.database = database or Database()
+        self.executor = ThreadPoolExecutor(
+            max_workers=getattr(self.database, "maxconn", 4),
+            thread_name_prefix="database",
+        )
+
+    def __getattr__(self, name):
+        if name not in self.QUERIES:
+            raise AttributeError(name)
+        method = getattr(self.database, name)
+
+        async def query(*args, **kwargs):
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self.executor, functools.partial(method, *args, **kwargs)
+            )
+
+        return query
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+
+
 if __name__ == "__main__":
     database = Database()
     print(database.is_authenticated("459ede94edbd1c8a1fc1a47194bebaf79523853e"))
@@ -0,0 +1,79 @@
+import asyncio
+import logging
+import time
+from collections import deque
+
+import numpy as np
+
+
+class LoopLagMonitor:
+    """
+    Measures how late the event loop wakes up from a short sleep. Every
+    websocket send/recv waits behind the same loop, so this lag is the
+    latency the servers on 5000/5678 add under inference load.
+    """
+
+    def __init__(self, interval=0.05, window=1200, report_every=60):
+        self.interval = interval
+        self.lags = deque(maxlen=window)
+        self.report_every = report_every
+
+    def percentiles(self, q=(50, 95, 99)):
+        if not self.lags:
+            return {p: 0.0 for p in q}
+        values = np.percentile(np.fromiter(self.lags, dtype=float), q)
+        return {p: float(v) for p, v in zip(q, values)}
+
+    async def run(self):
+        last_report = time.monotonic()
+        while True:
+            start = time.monotonic()
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self.lags.append(max(0.0, now - start - self.interval))
+            if now - last_report >= self.report_every:
+                p = self.percentiles()
+                logging.info(
+                    "Event loop lag ms p50=%.1f p95=%.1f p99=%.1f",
+                    p[50] * 1000,
+                    p[95] * 1000,
+                    p[99] * 1000,
+                )
+                last_report = now
+
+
+class StageTimer:
+    """
+    Keeps the latest durations of each pipeline stage for percentiles, and
+    feeds them to a labelled prometheus histogram when one is given.
+    """
+
+    def __init__(self, window=1000, histogram=None):
+        self.window = window
+        self.histogram = histogram
+        self.durations = {}  # stage -> deque of seconds
+        self.counts = {}
+
+    def observe(self, stage, seconds):
+        if stage not in self.durations:
+            self.durations[stage] = deque(maxlen=self.window)
+            self.counts[stage] = 0
+        self.durations[stage].append(seconds)
+        self.counts[stage] += 1
+        if self.histogram is not None:
+            self.histogram.labels(stage).observe(seconds)
+
+    async def timed(self, stage, awaitable):
+        """Awaits awaitable and records how long it took under stage."""
+        start = time.perf_counter()
+        try:
+            return await awaitable
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def percentiles(self, stage, q=(50, 95, 99)):
+        durations = self.durations.get(stage)
+        if not durations:
+            return {p: 0.0 for p in q}
+        values = np.percentile(np.fromiter(durations, dtype=float), q)
+        return {p: float(v) for p, v in zip(q, values)}
@@ -0,0 +1,69 @@
+import time
+
+import cv2
+
+
+class MotionGate:
+    """
+    Cheap scene-change filter in front of face detection. Each camera keeps
+    a running background of a small blurred grayscale copy of its frames;
+    a frame is forwarded only when enough of it differs from the background,
+    or when max_skip seconds passed since the last forwarded frame.
+    """
+
+    def __init__(
+        self, sensitivity=0.002, pixel_delta=25, width=160, max_skip=5.0, overrides=None
+    ):
+        self.sensitivity = sensitivity  # fraction of changed pixels
+        self.pixel_delta = pixel_delta
+        self.width = width
+        self.max_skip = max_skip
+        self.overrides = dict(overrides or {})  # url -> sensitivity
+        self.backgrounds = {}
+        self.last_forwarded = {}
+        self.moving = {}
+        self.seen = {}
+        self.skipped = {}
+
+    def set_sensitivity(self, url, sensitivity):
+        self.overrides[url] = sensitivity
+
+    def changed_fraction(self, url, frame):
+        height = max(1, frame.shape[0] * self.width // frame.shape[1])
+        small = cv2.resize(frame, (self.width, height), interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        small = cv2.GaussianBlur(small, (5, 5), 0).astype("float32")
+        background = self.backgrounds.get(url)
+        if background is None or background.shape != small.shape:
+            self.backgrounds[url] = small
+            return 1.0
+        diff = cv2.absdiff(small, background)
+        cv2.accumulateWeighted(small, background, 0.1)
+        return float((diff > self.pixel_delta).mean())
+
+    def accept(self, url, frame, now=None):
+        """True when frame should go on to face detection."""
+        if now is None:
+            now = time.monotonic()
+        self.seen[url] = self.seen.get(url, 0) + 1
+        fraction = self.changed_fraction(url, frame)
+        sensitivity = self.overrides.get(url, self.sensitivity)
+        self.moving[url] = fraction >= sensitivity
+        if (
+            self.moving[url]
+            or now - self.last_forwarded.get(url, float("-inf")) >= self.max_skip
+        ):
+            self.last_forwarded[url] = now
+            return True
+        self.skipped[url] = self.skipped.get(url, 0) + 1
+        return False
+
+    def skipped_fraction(self, url):
+        seen = self.seen.get(url, 0)
+        return self.skipped.get(url, 0) / seen if seen else 0.0
+
+    def discard(self, url):
+        self.backgrounds.pop(url, None)
+        self.last_forwarded.pop(url, None)
+        self.moving.pop(url, None)
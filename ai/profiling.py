@@ -0,0 +1,118 @@
+"""
+On-demand profiling of the running server, so nothing is paid for it until
+it is asked for. Results are written to PROFILE_DIR.
+
+    kill -USR1 <pid>    CPU profile of the event loop for PROFILE_SECONDS
+    kill -USR2 <pid>    tracemalloc allocations for PROFILE_SECONDS
+
+With PROFILE_SOCKET set, the duration can be given per request:
+    echo "cpu 30" | nc -U /run/facial-recognition.sock
+    echo "memory 120" | nc -U /run/facial-recognition.sock
+"""
+import asyncio
+import cProfile
+import io
+import logging
+import os
+import pstats
+import signal
+import time
+import tracemalloc
+
+KINDS = ("cpu", "memory")
+
+
+class Profiler:
+    """
+    Runs one CPU profile or tracemalloc capture at a time. The CPU profile
+    covers the event loop thread; time spent in inference threads shows up
+    as the awaits that wait for them.
+    """
+
+    def __init__(self, output_dir, seconds=30, top=50):
+        self.output_dir = output_dir
+        self.seconds = seconds
+        self.top = top
+        self.running = None
+
+    def install_signal_handlers(self):
+        loop = asyncio.get_running_loop()
+        loop.add_signal_handler(signal.SIGUSR1, self.start, "cpu")
+        loop.add_signal_handler(signal.SIGUSR2, self.start, "memory")
+
+    def start(self, kind, seconds=None):
+        """Starts a capture in the background; returns its output path or None."""
+        if self.running is not None:
+            logging.warning("Profiling already running, %s request ignored", kind)
+            return None
+        os.makedirs(self.output_dir, exist_ok=True)
+        name = f"{kind}-{time.strftime('%Y%m%d-%H%M%S')}"
+        path = os.path.join(self.output_dir, name)
+        capture = self.cpu if kind == "cpu" else self.memory
+        self.running = asyncio.create_task(capture(path, seconds or self.seconds))
+        self.running.add_done_callback(self.finished)
+        return path
+
+    def finished(self, task):
+        self.running = None
+        if not task.cancelled() and task.exception() is not None:
+            logging.error("Profiling failed: %s", task.exception())
+
+    async def cpu(self, path, seconds):
+        logging.info("CPU profile for %ss -> %s.prof", seconds, path)
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            profile.disable()
+        profile.dump_stats(path + ".prof")
+        summary = io.StringIO()
+        stats = pstats.Stats(profile, stream=summary)
+        stats.sort_stats("cumulative").print_stats(self.top)
+        with open(path + ".txt", "w") as f:
+            f.write(summary.getvalue())
+        logging.info("CPU profile written to %s.prof", path)
+
+    async def memory(self, path, seconds):
+        logging.info("tracemalloc for %ss -> %s.snapshot", seconds, path)
+        tracemalloc.start(25)
+        try:
+            await asyncio.sleep(seconds)
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        snapshot.dump(path + ".snapshot")
+        with open(path + ".txt", "w") as f:
+            f.write(
+                f"Allocated during {seconds}s and still alive: "
+                f"{current / 1024:.0f} KiB, peak {peak / 1024:.0f} KiB\n\n"
+            )
+            for stat in snapshot.statistics("lineno")[: self.top]:
+                f.write(f"{stat}\n")
+        logging.info("tracemalloc snapshot written to %s.snapshot", path)
+
+    async def serve(self, socket_path):
+        """Admin socket taking "cpu [seconds]" or "memory [seconds]" lines."""
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        server = await asyncio.start_unix_server(self.handle, path=socket_path)
+        os.chmod(socket_path, 0o600)
+        async with server:
+            await server.serve_forever()
+
+    async def handle(self, reader, writer):
+        try:
+            words = (await reader.readline()).decode().split()
+            if not words or words[0] not in KINDS:
+                reply = f"usage: {'|'.join(KINDS)} [seconds]"
+            else:
+                seconds = float(words[1]) if len(words) > 1 else None
+                path = self.start(words[0], seconds)
+                reply = path or "busy, a capture is already running"
+        except ValueError:
+            reply = "seconds must be a number"
+        writer.write(reply.encode() + b"\n")
+        await writer.drain()
+        writer.close()
@@ -0,0 +1,88 @@
+import math
+
+import cv2
+import numpy as np
+
+COMPONENTS = ("size", "detection", "sharpness", "pose")
+
+
+def estimate_yaw(kps):
+    """
+    Rough yaw in degrees from the five insightface landmarks: how far the
+    nose sits from the midpoint of the eyes, relative to the eye distance.
+    """
+    left_eye, right_eye, nose = kps[0], kps[1], kps[2]
+    eye_distance = np.linalg.norm(right_eye - left_eye)
+    if eye_distance < 1e-6:
+        return 90.0
+    offset = (nose[0] - (left_eye[0] + right_eye[0]) / 2) / eye_distance
+    return math.degrees(math.asin(max(-1.0, min(1.0, offset * 2))))
+
+
+def sharpness(frame, bbox, size=64):
+    """Variance of the Laplacian over the face crop, resized to a fixed size."""
+    height, width = frame.shape[:2]
+    x1, y1, x2, y2 = bbox.astype(int)
+    crop = frame[max(0, y1) : min(height, y2), max(0, x1) : min(width, x2)]
+    if crop.size == 0:
+        return 0.0
+    crop = cv2.resize(crop, (size, size), interpolation=cv2.INTER_AREA)
+    if crop.ndim == 3:
+        crop = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY)
+    return float(cv2.Laplacian(crop, cv2.CV_64F).var())
+
+
+class QualityGate:
+    """
+    Scores detected faces before they are tracked and embedded. Size,
+    detection score, sharpness and frontal pose are each mapped to [0, 1]
+    and combined by geometric mean, so one failing component is enough to
+    drop a face. Rejections are counted per camera by weakest component.
+    """
+
+    def __init__(
+        self, min_score=0.5, min_face=24, good_face=80, min_sharpness=100, max_yaw=60
+    ):
+        self.min_score = min_score
+        self.min_face = min_face
+        self.good_face = good_face
+        self.min_sharpness = min_sharpness
+        self.max_yaw = max_yaw
+        self.stats = {}  # url -> {"scored": n, "rejected": n, component: n}
+
+    def components(self, frame, face):
+        x1, y1, x2, y2 = face.bbox
+        side = min(x2 - x1, y2 - y1)
+        components = {
+            "size": (side - self.min_face) / (self.good_face - self.min_face),
+            "detection": float(face.det_score),
+            "sharpness": sharpness(frame, face.bbox) / self.min_sharpness,
+            "pose": 1.0,
+        }
+        if face.kps is not None:
+            components["pose"] = 1 - abs(estimate_yaw(face.kps)) / self.max_yaw
+        return {name: min(1.0, max(0.0, value)) for name, value in components.items()}
+
+    def score(self, frame, face):
+        """Returns (score, components) for one detected face."""
+        components = self.components(frame, face)
+        product = 1.0
+        for value in components.values():
+            product *= value
+        return product ** (1 / len(components)), components
+
+    def filter(self, url, frame, faces):
+        """Keeps the faces of one frame that score at least min_score."""
+        stats = self.stats.setdefault(
+            url, dict.fromkeys(("scored", "rejected") + COMPONENTS, 0)
+        )
+        kept = []
+        for face in faces:
+            score, components = self.score(frame, face)
+            stats["scored"] += 1
+            if score >= self.min_score:
+                kept.append(face)
+                continue
+            stats["rejected"] += 1
+            stats[min(components, key=components.get)] += 1
+        return kept
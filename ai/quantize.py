@@ -0,0 +1,143 @@
+"""
+Writes INT8 copies of the insightface recognition (and optionally
+detection) model next to the fp32 pack, in <model dir>_int8/. They are
+loaded instead of the fp32 models for the modules listed in
+FACE_QUANTIZED_MODULES.
+
+Without --calibration the weights are quantized dynamically. With a
+directory of images (same layout as media/criminals, or flat) the model is
+statically quantized, activations calibrated on faces from those images:
+    python quantize.py --modules recognition --calibration /data/labelled
+
+Check the accuracy cost before enabling it with
+    python -m benchmarks.quantized_accuracy /data/labelled
+"""
+import argparse
+import os
+
+import cv2
+import numpy as np
+from insightface.utils import face_align
+from onnxruntime.quantization import (
+    CalibrationDataReader,
+    QuantFormat,
+    QuantType,
+    quantize_dynamic,
+    quantize_static,
+)
+
+from settings import face_model_options
+from train import detect_faces, load_face_model, quantized_model_path
+
+
+def calibration_images(directory, limit):
+    paths = []
+    for root, _, files in os.walk(directory):
+        paths.extend(
+            os.path.join(root, name)
+            for name in sorted(files)
+            if name.endswith((".jpg", ".png"))
+        )
+    for path in sorted(paths)[:limit]:
+        image = cv2.imread(path)
+        if image is not None:
+            yield image
+
+
+def detection_blob(model, image):
+    """Letterboxes image to the detector input like RetinaFace.detect does."""
+    width, height = model.input_size
+    scale = min(width / image.shape[1], height / image.shape[0])
+    resized = cv2.resize(
+        image, (int(image.shape[1] * scale), int(image.shape[0] * scale))
+    )
+    canvas = np.zeros((height, width, 3), dtype=np.uint8)
+    canvas[: resized.shape[0], : resized.shape[1]] = resized
+    return cv2.dnn.blobFromImage(
+        canvas,
+        1.0 / model.input_std,
+        (width, height),
+        (model.input_mean,) * 3,
+        swapRB=True,
+    )
+
+
+def recognition_blobs(face_model, model, image):
+    """Aligned face crops preprocessed like ArcFaceONNX.get_feat."""
+    crops = [
+        face_align.norm_crop(image, landmark=face.kps, image_size=model.input_size[0])
+        for face in detect_faces(face_model, image)
+    ]
+    if not crops:
+        return []
+    blob = cv2.dnn.blobFromImages(
+        crops,
+        1.0 / model.input_std,
+        model.input_size,
+        (model.input_mean,) * 3,
+        swapRB=True,
+    )
+    return [blob[i : i + 1] for i in range(len(blob))]
+
+
+class FaceCalibrationReader(CalibrationDataReader):
+    def __init__(self, face_model, taskname, directory, limit):
+        model = face_model.models[taskname]
+        self.input_name = model.input_name
+        self.blobs = []
+        for image in calibration_images(directory, limit):
+            if taskname == "detection":
+                self.blobs.append(detection_blob(model, image))
+            else:
+                self.blobs.extend(recognition_blobs(face_model, model, image))
+        print(f"{taskname}: {len(self.blobs)} calibration inputs")
+        self.iterator = iter(self.blobs)
+
+    def get_next(self):
+        blob = next(self.iterator, None)
+        return None if blob is None else {self.input_name: blob}
+
+
+def quantize_module(face_model, taskname, calibration=None, limit=200):
+    source = face_model.models[taskname].model_file
+    target = quantized_model_path(source)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    if calibration is None:
+        quantize_dynamic(source, target, weight_type=QuantType.QUInt8)
+    else:
+        quantize_static(
+            source,
+            target,
+            FaceCalibrationReader(face_model, taskname, calibration, limit),
+            quant_format=QuantFormat.QDQ,
+            per_channel=True,
+            activation_type=QuantType.QUInt8,
+            weight_type=QuantType.QInt8,
+        )
+    print(
+        f"{taskname}: {source} ({os.path.getsize(source) >> 20} MB) -> "
+        f"{target} ({os.path.getsize(target) >> 20} MB)"
+    )
+    return target
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--modules",
+        nargs="+",
+        default=["recognition"],
+        choices=["recognition", "detection"],
+    )
+    parser.add_argument("--calibration", help="image directory for static quantization")
+    parser.add_argument("--limit", type=int, default=200, help="calibration images")
+    args = parser.parse_args()
+
+    # Quantize from the fp32 models regardless of FACE_QUANTIZED_MODULES
+    face_model = load_face_model(dict(face_model_options(), quantized=[]))
+    for taskname in args.modules:
+        quantize_module(face_model, taskname, args.calibration, args.limit)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+import time
+
+
+class SamplingScheduler:
+    """
+    Assigns every camera a sampling rate out of a global frames/sec budget.
+    Cameras with recent motion or detections get active_weight times the
+    share of idle ones, each rate clamped to [min_fps, max_fps]. Once
+    processing throughput has been measured the budget follows it, so
+    cameras are never sampled faster than inference can keep up with.
+
+    workers is how many frames inference runs in parallel. A batch
+    smaller than that leaves workers unused, so its throughput is scaled
+    to a full batch; otherwise a low budget would keep batches small and
+    its own measurement low. While the frame queue runs empty the budget
+    probes upward by probe per batch.
+    """
+
+    def __init__(
+        self,
+        fps_budget=20.0,
+        min_fps=0.5,
+        max_fps=10.0,
+        active_seconds=10.0,
+        active_weight=4.0,
+        headroom=0.9,
+        update_interval=1.0,
+        workers=1,
+        probe=0.02,
+    ):
+        self.max_budget = fps_budget
+        self.min_fps = min_fps
+        self.max_fps = max_fps
+        self.active_seconds = active_seconds
+        self.active_weight = active_weight
+        self.headroom = headroom
+        self.update_interval = update_interval
+        self.workers = workers
+        self.probe = probe
+        self.cameras = set()
+        self.last_activity = {}
+        self.capacity = None  # measured frames/sec, exponential average
+        self.rates = {}
+        self.updated_at = float("-inf")
+
+    @property
+    def budget(self):
+        if self.capacity is None:
+            return self.max_budget
+        return min(self.max_budget, self.capacity * self.headroom)
+
+    def add(self, url):
+        self.cameras.add(url)
+        self.updated_at = float("-inf")
+
+    def discard(self, url):
+        self.cameras.discard(url)
+        self.last_activity.pop(url, None)
+        self.rates.pop(url, None)
+        self.updated_at = float("-inf")
+
+    def record_activity(self, url, now=None):
+        """Motion or faces on a camera; raises its rate for active_seconds."""
+        self.last_activity[url] = time.monotonic() if now is None else now
+
+    def record_processing(self, frames, seconds, idle=False):
+        """
+        Feeds measured inference throughput into the budget; idle means
+        the frame queue was empty after the batch.
+        """
+        if frames == 0 or seconds <= 0:
+            return
+        fps = max(frames, self.workers) / seconds
+        if self.capacity is None:
+            self.capacity = fps
+        else:
+            self.capacity = 0.9 * self.capacity + 0.1 * fps
+        if idle:
+            # Probe no further than what already allows the full budget
+            ceiling = self.max_budget / self.headroom
+            self.capacity = min(self.capacity * (1 + self.probe), ceiling)
+
+    def update(self, now=None):
+        now = time.monotonic() if now is None else now
+        weights = {}
+        for url in self.cameras:
+            idle_for = now - self.last_activity.get(url, float("-inf"))
+            weights[url] = self.active_weight if idle_for < self.active_seconds else 1.0
+        total = sum(weights.values()) or 1.0
+        budget = self.budget
+        self.rates = {
+            url: min(self.max_fps, max(self.min_fps, budget * weight / total))
+            for url, weight in weights.items()
+        }
+        self.updated_at = now
+
+    def interval(self, url):
+        """Seconds to wait before sampling the next frame from url."""
+        now = time.monotonic()
+        if url not in self.cameras:
+            self.add(url)
+        if now - self.updated_at >= self.update_interval:
+            self.update(now)
+        return 1.0 / self.rates.get(url, self.min_fps)
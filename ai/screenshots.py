@@ -0,0 +1,121 @@
+import asyncio
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+
+def derived_filename(filename, kind):
+    """
+    Where the preview or thumbnail of a screenshot goes: media/screenshots/...
+    becomes media/<kind>/..., so the directories the API lists only hold
+    full screenshots.
+    """
+    head, separator, tail = filename.partition("/screenshots/")
+    if not separator:
+        head, tail = os.path.split(filename)
+    return f"{head}/{kind}/{tail}"
+
+
+def preview_filename(filename):
+    return derived_filename(filename, "previews")
+
+
+def thumbnail_filename(filename):
+    return derived_filename(filename, "thumbnails")
+
+
+def crop_box(shape, bbox, margin=0.25):
+    """The face box widened by margin on each side, clipped to the frame, or None."""
+    if bbox is None:
+        return None
+    x1, y1, x2, y2 = bbox[:4]
+    pad_x, pad_y = (x2 - x1) * margin, (y2 - y1) * margin
+    height, width = shape[:2]
+    x1, y1 = max(int(x1 - pad_x), 0), max(int(y1 - pad_y), 0)
+    x2, y2 = min(int(x2 + pad_x), width), min(int(y2 + pad_y), height)
+    if x2 <= x1 or y2 <= y1:
+        return None
+    return x1, y1, x2, y2
+
+
+def valid_frame(frame):
+    return isinstance(frame, np.ndarray) and frame.size > 0
+
+
+def has_thumbnail(frame, bbox):
+    """Whether ScreenshotWriter.write will produce a face thumbnail."""
+    return valid_frame(frame) and crop_box(frame.shape, bbox) is not None
+
+
+def log_error(future):
+    if future.exception() is not None:
+        logging.error("Saving screenshot failed: %s", future.exception())
+
+
+def fit(image, size):
+    """Downscales image so its longer side is at most size."""
+    scale = size / max(image.shape[:2])
+    if scale >= 1:
+        return image
+    return cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+
+class ScreenshotWriter:
+    """
+    Encodes and writes alert and suspend screenshots on a thread pool,
+    off the event loop. An alert gets the full frame at the configured
+    JPEG quality, a downscaled preview, and a thumbnail of the face when
+    its box is known, so web clients need not fetch the full frame.
+    """
+
+    def __init__(self, workers=2, quality=85, preview_size=640, thumbnail_size=160):
+        self.executor = ThreadPoolExecutor(workers, thread_name_prefix="screenshot")
+        self.params = [cv2.IMWRITE_JPEG_QUALITY, quality]
+        self.preview_size = preview_size
+        self.thumbnail_size = thumbnail_size
+
+    def encode(self, image, filename):
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        ok, data = cv2.imencode(".jpg", image, self.params)
+        if not ok:
+            raise ValueError(f"Could not encode {filename}")
+        with open(filename, "wb") as f:
+            f.write(data.tobytes())
+        return filename
+
+    def write(self, frame, filename, bbox=None, preview=True):
+        """Writes the frame and its derived images; returns {kind: filename} or None."""
+        if not valid_frame(frame):
+            logging.warning("Invalid frame received, skipping screenshot.")
+            return None
+        written = {"screenshot": self.encode(frame, filename)}
+        if preview:
+            written["preview"] = self.encode(
+                fit(frame, self.preview_size), preview_filename(filename)
+            )
+        box = crop_box(frame.shape, bbox)
+        if box is not None:
+            x1, y1, x2, y2 = box
+            written["thumbnail"] = self.encode(
+                fit(frame[y1:y2, x1:x2], self.thumbnail_size),
+                thumbnail_filename(filename),
+            )
+        return written
+
+    def submit(self, frame, filename, bbox=None, preview=True):
+        """write() in the background without waiting; errors are logged."""
+        future = self.executor.submit(self.write, frame, filename, bbox, preview)
+        future.add_done_callback(log_error)
+        return future
+
+    async def save(self, frame, filename, bbox=None, preview=True):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.executor, self.write, frame, filename, bbox, preview
+        )
+
+    def close(self):
+        self.executor.shutdown(wait=True)
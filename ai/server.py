@@ -1,96 +1,499 @@
 import asyncio
 import json
-import tracemalloc
+import time
 from datetime import datetime
 import logging
 import websockets
 from urllib.parse import urlparse
-from imutils.video import VideoStream
-import cv2
 import os
+import psycopg2
 
-from models import Database
+from models import AsyncDatabase, Database, ENROLLMENT_CHANNEL, METADATA_CHANNEL
 from path import abs_path
-from train import FaceTrainer
+from settings import (
+    INFERENCE_MAX_IN_FLIGHT,
+    INFERENCE_PROCESSES,
+    SIMILARITY_THRESHOLD,
+    INFERENCE_BACKEND,
+    INFERENCE_WORKERS,
+    TRACK_REFRESH_INTERVAL,
+    TRACK_IOU_THRESHOLD,
+    CAMERA_STALL_TIMEOUT,
+    TRACK_MAX_MISSED,
+    CAMERA_MAX_BACKOFF,
+    DB_HEALTH_CHECK_INTERVAL,
+    MOTION_CAMERA_SENSITIVITY,
+    MOTION_PIXEL_DELTA,
+    MOTION_SENSITIVITY,
+    FRAME_QUEUE_DEPTH,
+    MOTION_MAX_SKIP,
+    MOTION_GATE,
+    FRAME_SLOT_BYTES,
+    SAMPLING_FPS_BUDGET,
+    SAMPLING_MIN_FPS,
+    SAMPLING_MAX_FPS,
+    SAMPLING_ACTIVE_SECONDS,
+    QUALITY_MIN_SCORE,
+    QUALITY_MIN_FACE,
+    QUALITY_GOOD_FACE,
+    QUALITY_MIN_SHARPNESS,
+    QUALITY_MAX_YAW,
+    ALERT_CONFIRM_K,
+    ALERT_CONFIRM_N,
+    METRICS_PORT,
+    METRICS_ADDRESS,
+    PROFILE_DIR,
+    PROFILE_SECONDS,
+    PROFILE_SOCKET,
+    SCREENSHOT_WORKERS,
+    SCREENSHOT_JPEG_QUALITY,
+    SCREENSHOT_PREVIEW_SIZE,
+    SCREENSHOT_THUMBNAIL_SIZE,
+    index_options,
+)
+from train import FaceTrainer, detect_faces, embed_faces
 from utils import host_address
 from face_recognition import FaceRecognition
 from socket_manager import WebSocketManager
 from alert_manager import AlertManager
+from inference import InferenceExecutor
+from worker_pool import InferenceWorkerPool
+from monitoring import LoopLagMonitor, StageTimer
+from metrics import FACES_PER_FRAME, STAGE_SECONDS, start_metrics_server
+from profiling import Profiler
+from screenshots import ScreenshotWriter
+from tracing import LatencyTracker
+from metadata_cache import MetadataCache
+from frame_queue import LatestFrameQueue
+from camera_supervisor import CameraSupervisor
+from tracker import FaceTracker
+from motion import MotionGate
+from sampling import SamplingScheduler
+from quality import QualityGate
+from confirmation import ConfirmationBuffer
 
-tracemalloc.start()
 logging.basicConfig(level=logging.DEBUG)
 
 
+def mark(traces, stage):
+    for trace in traces:
+        if trace is not None:
+            trace.mark(stage)
+
+
 class MainStream:
-    def __init__(self, root_dir, camera_urls):
+    def __init__(self, root_dir, camera_urls, batch_size=8, database=None):
         self.root_dir = root_dir
-        self.database = Database()
+        self.database = database or Database()
+        self.async_database = AsyncDatabase(self.database)
         self.websocket_manager = WebSocketManager()
         self.urls = camera_urls
-        self.trainer = FaceTrainer(root_dir)
-        self.index = self.trainer.index
-        self.known_face_names = self.trainer.known_face_names
+        self.trainer = FaceTrainer(root_dir, index_options=index_options())
+        self.gallery = self.trainer.gallery
         self.face_model = self.trainer.face_model
-        self.alert_manager = AlertManager(self.websocket_manager)
-        self.face_recognition = FaceRecognition(self)
-        self.processing_queue = asyncio.Queue()  # Queue for processing frames
+        self.metadata = MetadataCache(self.async_database)
+        self.latency = LatencyTracker()
+        self.screenshots = ScreenshotWriter(
+            SCREENSHOT_WORKERS,
+            SCREENSHOT_JPEG_QUALITY,
+            SCREENSHOT_PREVIEW_SIZE,
+            SCREENSHOT_THUMBNAIL_SIZE,
+        )
+        self.alert_manager = AlertManager(
+            self.websocket_manager,
+            self.metadata,
+            latency=self.latency,
+            screenshots=self.screenshots,
+        )
+        self.face_recognition = FaceRecognition(self, SIMILARITY_THRESHOLD)
+        self.confirmation = ConfirmationBuffer(ALERT_CONFIRM_K, ALERT_CONFIRM_N)
+        self.processing_queue = LatestFrameQueue(FRAME_QUEUE_DEPTH)
+        self.motion_gate = None
+        if MOTION_GATE:
+            self.motion_gate = MotionGate(
+                MOTION_SENSITIVITY,
+                MOTION_PIXEL_DELTA,
+                max_skip=MOTION_MAX_SKIP,
+                overrides=MOTION_CAMERA_SENSITIVITY,
+            )
+        self.scheduler = SamplingScheduler(
+            SAMPLING_FPS_BUDGET,
+            SAMPLING_MIN_FPS,
+            SAMPLING_MAX_FPS,
+            active_seconds=SAMPLING_ACTIVE_SECONDS,
+            # Frames inferred in parallel
+            workers=(
+                INFERENCE_PROCESSES
+                if INFERENCE_BACKEND == "process"
+                else INFERENCE_WORKERS
+            ),
+        )
+        self.camera_supervisor = CameraSupervisor(
+            self.database,
+            self.processing_queue,
+            stall_timeout=CAMERA_STALL_TIMEOUT,
+            max_backoff=CAMERA_MAX_BACKOFF,
+            motion_gate=self.motion_gate,
+            scheduler=self.scheduler,
+        )
+        self.quality_gate = None
+        if QUALITY_MIN_SCORE > 0:
+            self.quality_gate = QualityGate(
+                QUALITY_MIN_SCORE,
+                QUALITY_MIN_FACE,
+                QUALITY_GOOD_FACE,
+                QUALITY_MIN_SHARPNESS,
+                QUALITY_MAX_YAW,
+            )
+        self.batch_size = batch_size  # Max frames searched together
+        self.trackers = {}  # url -> FaceTracker
+        self.inference = InferenceExecutor(INFERENCE_WORKERS, INFERENCE_MAX_IN_FLIGHT)
+        self.worker_pool = None
+        if INFERENCE_BACKEND == "process":
+            self.worker_pool = InferenceWorkerPool(
+                INFERENCE_PROCESSES,
+                index_options=index_options(),
+                threshold=SIMILARITY_THRESHOLD,
+                slot_bytes=FRAME_SLOT_BYTES,
+            )
+        self.oversize_shapes = set()  # frame shapes too large for a worker slot
+        self.loop_lag = LoopLagMonitor()
+        self.stages = StageTimer(histogram=STAGE_SECONDS)
+        self.last_screenshot_time = datetime.now()
+        self.screenshot_interval = 5
 
-    async def capture_and_send_frames(self, url):
-        """Captures frames and sends them to the processing queue."""
-        cap = VideoStream(url).start()
-        while True:
-            frame = cap.read()
-            if frame is not None:
-                await self.processing_queue.put((frame, url))
-            await asyncio.sleep(0.1)
+    def next_batch(self, first):
+        """
+        Drains frames already waiting in the queue into one micro-batch.
+        Returns the (frame, url) pairs and their traces.
+        """
+        items = [first]
+        while len(items) < self.batch_size and not self.processing_queue.empty():
+            items.append(self.processing_queue.get_nowait())
+        return [(frame, url) for frame, url, _ in items], [t for _, _, t in items]
+
+    def tracker(self, url):
+        if url not in self.trackers:
+            self.trackers[url] = FaceTracker(
+                TRACK_IOU_THRESHOLD, TRACK_MAX_MISSED, TRACK_REFRESH_INTERVAL
+            )
+        return self.trackers[url]
+
+    def use_worker_pool(self, frame):
+        if self.worker_pool is None:
+            return False
+        if self.worker_pool.fits(frame):
+            return True
+        if frame.shape not in self.oversize_shapes:
+            self.oversize_shapes.add(frame.shape)
+            logging.warning(
+                "Frames of shape %s exceed FRAME_SLOT_BYTES, inferring them in-process",
+                frame.shape,
+            )
+        return False
+
+    async def detect(self, frame):
+        """Returns the detected faces, without embeddings."""
+        if self.use_worker_pool(frame):
+            return await self.stages.timed("detect", self.worker_pool.detect(frame))
+        return await self.stages.timed(
+            "detect", self.inference.run(detect_faces, self.face_model, frame)
+        )
+
+    async def identify(self, batch, frames_faces):
+        """Embeds the given faces of every frame; returns their criminal id or None."""
+        if self.worker_pool is None:
+            return await self.identify_local(batch, frames_faces)
+        pooled, local = [], []
+        for i, (frame, _) in enumerate(batch):
+            (pooled if self.use_worker_pool(frame) else local).append(i)
+        results = [None] * len(batch)
+        # Workers embed and search in one call, timed together as embed
+        matches = await asyncio.gather(
+            *(
+                self.stages.timed(
+                    "embed", self.worker_pool.embed(batch[i][0], frames_faces[i])
+                )
+                for i in pooled
+            )
+        )
+        for i, names in zip(pooled, matches):
+            results[i] = names
+        if local:
+            matches = await self.identify_local(
+                [batch[i] for i in local], [frames_faces[i] for i in local]
+            )
+            for i, names in zip(local, matches):
+                results[i] = names
+        return results
+
+    async def identify_local(self, batch, frames_faces):
+        """identify() on the in-process model and gallery."""
+        await asyncio.gather(
+            *(
+                self.stages.timed(
+                    "embed",
+                    self.inference.run(embed_faces, self.face_model, frame, faces),
+                )
+                for (frame, _), faces in zip(batch, frames_faces)
+                if faces
+            )
+        )
+        start = time.perf_counter()
+        matches = self.face_recognition.match_frames(
+            frames_faces, self.gallery.snapshot
+        )
+        self.stages.observe("search", time.perf_counter() - start)
+        return matches
+
+    async def recognize_batch(self, batch, now=None, traces=()):
+        """
+        Detects and tracks faces, embedding only new tracks and tracks due
+        for a refresh. Faces failing the quality gate are dropped before
+        tracking. Returns the tracks seen in every frame.
+        """
+        if now is None:
+            now = time.monotonic()
+        detections = await asyncio.gather(*(self.detect(frame) for frame, _ in batch))
+        mark(traces, "detected")
+        frames_tracks, to_embed, to_update = [], [], []
+        for (frame, url), faces in zip(batch, detections):
+            FACES_PER_FRAME.observe(len(faces))
+            if self.quality_gate is not None:
+                faces = self.quality_gate.filter(url, frame, faces)
+            tracker = self.tracker(url)
+            tracks = tracker.update(faces, now)
+            stale = [
+                i
+                for i, track in enumerate(tracks)
+                if tracker.needs_embedding(track, now)
+            ]
+            frames_tracks.append(tracks)
+            to_embed.append([faces[i] for i in stale])
+            to_update.append((tracker, [tracks[i] for i in stale]))
+        results = await self.identify(batch, to_embed)
+        mark(traces, "identified")
+        for (tracker, tracks), names in zip(to_update, results):
+            for track, name in zip(tracks, names):
+                tracker.identified(track, name, now)
+        return frames_tracks
 
     async def process_frames(self):
         """Processes frames from all cameras."""
-        last_screenshot_time = datetime.now()
-        screenshot_interval = 5
         while True:
-            frame, url = await self.processing_queue.get()
-            self.face_recognition.current_frame = frame
-            current_time = datetime.now()
-            faces = self.face_model.get(frame)
-            tasks = [self.face_recognition.process_face(face) for face in faces]
-            results = await asyncio.gather(*tasks)
-            for name in results:
-                if name is not None:
-                    await self.alert_manager.handle_alert(
-                        frame=frame, detected_face=name, url=url
+            batch, traces = self.next_batch(await self.processing_queue.get())
+            try:
+                await self.process_batch(batch, traces=traces)
+            except Exception:
+                # One bad frame must not stop every camera
+                logging.exception(
+                    "Processing a batch from %s failed",
+                    ", ".join(sorted({url for _, url in batch})),
+                )
+
+    async def process_batch(self, batch, now=None, traces=None):
+        """
+        Recognizes one micro-batch and raises alerts for confirmed matches.
+        now overrides the monotonic clock, for replaying recordings.
+        """
+        current_time = datetime.now()
+        started = time.monotonic()
+        traces = traces or [None] * len(batch)
+        results = await self.recognize_batch(batch, now, traces)
+        if now is None:
+            now = time.monotonic()
+        self.scheduler.record_processing(
+            len(batch),
+            time.monotonic() - started,
+            idle=self.processing_queue.empty(),
+        )
+        for (frame, url), tracks, trace in zip(batch, results, traces):
+            if tracks:
+                self.scheduler.record_activity(url)
+            for track in tracks:
+                confirmed = self.confirmation.update(
+                    url, track.id, track.identity, now, track.reidentified
+                )
+                if track.identity is not None:
+                    self.alert_manager.record_sighting(track.identity, url, track.id)
+                if confirmed:
+                    track.confirmed = True
+                    await self.stages.timed(
+                        "alert",
+                        self.alert_manager.handle_alert(
+                            frame=frame,
+                            detected_face=track.identity,
+                            url=url,
+                            track_id=track.id,
+                            trace=trace,
+                            bbox=track.bbox,
+                        ),
                     )
-            if (
-                current_time - last_screenshot_time
-            ).total_seconds() >= screenshot_interval:
-                self.save_screenshot(frame, url, current_time)
-                last_screenshot_time = current_time
+        self.confirmation.prune(now)
+        mark(traces, "processed")
+        for trace in traces:
+            if trace is not None:
+                self.latency.record(trace, "processed")
+        if (
+            current_time - self.last_screenshot_time
+        ).total_seconds() >= self.screenshot_interval:
+            frame, url = batch[-1]
+            self.save_screenshot(frame, url, current_time)
+            self.last_screenshot_time = current_time
 
-    async def reload_face_encodings_periodically(self):
+    async def report_queue_stats(self, interval=60):
+        """Logs per-camera state, dropped frames and queue age for capacity planning."""
         while True:
-            self.index, self.known_face_names = self.trainer.load_face_encodings(
-                self.root_dir
+            await asyncio.sleep(interval)
+            states = self.camera_supervisor.states()
+            for url, stats in self.processing_queue.stats().items():
+                tracker = self.trackers.get(url)
+                skipped = 0.0
+                if self.motion_gate is not None:
+                    skipped = self.motion_gate.skipped_fraction(url)
+                logging.info(
+                    "Frames %s [%s]: rate=%.1ffps static skipped=%.0f%% "
+                    "received=%d dropped=%d "
+                    "queued=%d age avg=%.0fms max=%.0fms, "
+                    "faces detected=%d embedded=%d",
+                    url,
+                    states.get(url, {}).get("state", "removed"),
+                    self.scheduler.rates.get(url, 0.0),
+                    skipped * 100,
+                    stats["received"],
+                    stats["dropped"],
+                    stats["queued"],
+                    stats["age_avg"] * 1000,
+                    stats["age_max"] * 1000,
+                    tracker.detections if tracker else 0,
+                    tracker.embeddings if tracker else 0,
+                )
+                processed = self.latency.percentiles(url, "processed")
+                if processed is not None:
+                    delivered = self.latency.percentiles(url, "delivered") or {}
+                    logging.info(
+                        "Latency %s: capture to processed p50=%.0fms p95=%.0fms "
+                        "p99=%.0fms, capture to alert delivered p95=%s",
+                        url,
+                        processed[50] * 1000,
+                        processed[95] * 1000,
+                        processed[99] * 1000,
+                        "%.0fms" % (delivered[95] * 1000) if delivered else "n/a",
+                    )
+                if self.quality_gate is not None and url in self.quality_gate.stats:
+                    quality = self.quality_gate.stats[url]
+                    logging.info(
+                        "Face quality %s: rejected %d of %d "
+                        "(size=%d detection=%d sharpness=%d pose=%d)",
+                        url,
+                        quality["rejected"],
+                        quality["scored"],
+                        quality["size"],
+                        quality["detection"],
+                        quality["sharpness"],
+                        quality["pose"],
+                    )
+
+            logging.info(
+                "Sampling budget %.1ffps (measured capacity %s)",
+                self.scheduler.budget,
+                "%.1ffps" % self.scheduler.capacity
+                if self.scheduler.capacity is not None
+                else "unknown",
             )
-            (
-                self.face_recognition.index,
-                self.face_recognition.known_face_names,
-            ) = self.trainer.load_face_encodings(self.root_dir)
+
+    async def reload_face_encodings_periodically(self):
+        """Full reconcile against media/criminals, a fallback for missed notifications."""
+        loop = asyncio.get_running_loop()
+        while True:
             await asyncio.sleep(60)
+            await loop.run_in_executor(None, self.trainer.reload)
+
+    async def watch_enrollments(self):
+        """
+        Applies criminal create/update/delete notifications sent by the API,
+        and drops cached camera/criminal rows when the API changes them.
+        The LISTEN connection is reopened with backoff whenever it fails.
+        """
+        loop = asyncio.get_running_loop()
+        backoff = 1
+        missed = False  # notifications may have been sent while disconnected
+        while True:
+            try:
+                connection = await loop.run_in_executor(
+                    None, self.database.listen, ENROLLMENT_CHANNEL, METADATA_CHANNEL
+                )
+            except psycopg2.Error as e:
+                logging.warning("LISTEN failed, retrying in %ds: %s", backoff, e)
+                missed = True
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, CAMERA_MAX_BACKOFF)
+                continue
+            backoff = 1
+            # Changes made before LISTEN are not announced again
+            self.metadata.clear()
+            if missed:
+                await loop.run_in_executor(None, self.trainer.reload)
+            try:
+                await self.apply_notifications(connection)
+            except psycopg2.Error as e:
+                logging.warning("LISTEN connection lost, reconnecting: %s", e)
+                missed = True
+            finally:
+                connection.close()
+
+    async def apply_notifications(self, connection):
+        """Runs until the LISTEN connection fails, then raises its psycopg2.Error."""
+        loop = asyncio.get_running_loop()
+        changes = asyncio.Queue()
+
+        def on_notify():
+            try:
+                connection.poll()
+            except psycopg2.Error as e:
+                changes.put_nowait((None, e))
+                return
+            while connection.notifies:
+                notify = connection.notifies.pop(0)
+                changes.put_nowait((notify.channel, notify.payload))
+
+        def ping():
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+
+        fd = connection.fileno()
+        loop.add_reader(fd, on_notify)
+        try:
+            while True:
+                try:
+                    channel, payload = await asyncio.wait_for(
+                        changes.get(), DB_HEALTH_CHECK_INTERVAL
+                    )
+                except asyncio.TimeoutError:
+                    # A connection dropped without a FIN never wakes the reader
+                    await loop.run_in_executor(None, ping)
+                    on_notify()
+                    continue
+                if channel is None:
+                    raise payload
+                if channel == METADATA_CHANNEL:
+                    self.metadata.invalidate(*payload.split(":", 1))
+                    continue
+                action, criminal_id = payload.split(":", 1)
+                await loop.run_in_executor(
+                    None, self.trainer.apply_enrollment, action, criminal_id
+                )
+        finally:
+            loop.remove_reader(fd)
 
     async def start_camera_streams(self):
         """Start frame capture tasks for all cameras and the central processing task."""
-        tasks = [
-            asyncio.create_task(self.capture_and_send_frames(url)) for url in self.urls
-        ]
-        tasks.append(asyncio.create_task(self.process_frames()))
-        await asyncio.gather(*tasks)
-
-    async def reconnect_cameras_periodically(self, interval=60):
-        """Reconnects to all cameras one by one at specified intervals."""
-        while True:
-            for url in database.get_camera_urls():
-                asyncio.create_task(self.capture_and_send_frames(url))
-            await asyncio.sleep(interval)
+        if self.worker_pool is not None:
+            self.worker_pool.start(self.gallery)
+        self.alert_manager.pipeline.start()
+        await asyncio.gather(
+            self.camera_supervisor.run(self.urls), self.process_frames()
+        )
 
     def save_screenshot(self, frame, url, timestamp):
         """Saves a screenshot with a specific naming format, including only the IP address from the URL."""
@@ -100,9 +503,9 @@ class MainStream:
         formatted_time = timestamp.strftime("%Y-%m-%d|%H-%M-%S")
         filename = f"{formatted_time}|{ip_address}.jpg"
         directory = os.path.join("../media/screenshots/suspends")
-        os.makedirs(directory, exist_ok=True)  # Ensure directory exists
         filepath = os.path.join(directory, filename)
-        cv2.imwrite(filepath, frame)
+        # Full frame only, suspend screenshots are listed but never sent with previews
+        self.screenshots.submit(frame, filepath, preview=False)
 
 
 async def websocket_server(websocket, path):
@@ -112,7 +515,7 @@ async def websocket_server(websocket, path):
         data = json.loads(message)
         token = data.get("token", None)
         if token is not None:
-            if database.is_authenticated(token):
+            if await stream.async_database.is_authenticated(token):
                 await manager.register(websocket, data)
             else:
                 await websocket.send(json.dumps({"msg": "Invalid token provided!"}))
@@ -162,7 +565,7 @@ async def send_image_paths(websocket, path):
             if creation_time > connection_time:
                 image_name = os.path.basename(file_path)
                 camera_url = image_name.split("|")[-1].rstrip(".jpg")
-                camera_object = database.get_by_similar(camera_url)
+                camera_object = await stream.metadata.get_by_similar(camera_url)
                 image_url = file_path.replace("../", host_address + "/", 1)
                 camera_object["image"] = (
                     host_address + "/media/" + camera_object.get("image")
@@ -183,25 +586,37 @@ async def image_path_server(websocket, path):
 
 
 async def main():
+    if METRICS_PORT:
+        start_metrics_server(stream, METRICS_PORT, METRICS_ADDRESS)
+    profiler = Profiler(PROFILE_DIR, PROFILE_SECONDS)
+    profiler.install_signal_handlers()
+    background_tasks = []
+    if PROFILE_SOCKET:
+        background_tasks.append(asyncio.create_task(profiler.serve(PROFILE_SOCKET)))
     ws_server = await websockets.serve(websocket_server, "0.0.0.0", 5000)
     img_server = await websockets.serve(image_path_server, "0.0.0.0", 5678)
     camera_streams_task = asyncio.create_task(stream.start_camera_streams())
     reload_encodings_task = asyncio.create_task(
         stream.reload_face_encodings_periodically()
     )
-    camera_reconnection = asyncio.create_task(stream.reconnect_cameras_periodically())
+    enrollment_task = asyncio.create_task(stream.watch_enrollments())
+    loop_lag_task = asyncio.create_task(stream.loop_lag.run())
+    queue_stats_task = asyncio.create_task(stream.report_queue_stats())
     await asyncio.gather(
         ws_server.wait_closed(),
         img_server.wait_closed(),
         camera_streams_task,
         reload_encodings_task,
-        camera_reconnection,
+        enrollment_task,
+        loop_lag_task,
+        queue_stats_task,
+        *background_tasks,
     )
 
 
 if __name__ == "__main__":
     database = Database()
-    urls = database.get_camera_urls()
-    stream = MainStream(abs_path() + "media/criminals", urls)
+    urls = database.get_camera_urls()  # None: CameraSupervisor.run retries
+    stream = MainStream(abs_path() + "media/criminals", urls, database=database)
     logging.basicConfig(level=logging.INFO)
     asyncio.run(main())
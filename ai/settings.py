@@ -0,0 +1,153 @@
+import json
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Minimum cosine similarity between a face and the gallery to raise an
+# alert. Shared with api/utils.is_similar; tune it with calibrate.py.
+SIMILARITY_THRESHOLD = float(os.environ.get("SIMILARITY_THRESHOLD", 0.45))
+
+# Threads running face_model.get, and how many frames may be queued or
+# running on them at once
+INFERENCE_WORKERS = int(os.environ.get("INFERENCE_WORKERS", 1))
+INFERENCE_MAX_IN_FLIGHT = int(os.environ.get("INFERENCE_MAX_IN_FLIGHT", 2))
+
+# "thread" runs the model in-process on the threads above, "process" on a
+# pool of worker processes fed through shared memory (see worker_pool.py)
+INFERENCE_BACKEND = os.environ.get("INFERENCE_BACKEND", "thread")
+INFERENCE_PROCESSES = int(os.environ.get("INFERENCE_PROCESSES", os.cpu_count() or 1))
+FRAME_SLOT_BYTES = int(os.environ.get("FRAME_SLOT_BYTES", 1920 * 1080 * 3))
+
+# Frames kept per camera waiting for inference; older ones are dropped
+FRAME_QUEUE_DEPTH = int(os.environ.get("FRAME_QUEUE_DEPTH", 1))
+
+# Seconds without a new frame before a camera is reconnected, and the cap
+# on the exponential reconnect backoff
+CAMERA_STALL_TIMEOUT = float(os.environ.get("CAMERA_STALL_TIMEOUT", 10))
+CAMERA_MAX_BACKOFF = float(os.environ.get("CAMERA_MAX_BACKOFF", 60))
+
+# Motion gate in front of detection: fraction of changed pixels needed to
+# forward a frame (per camera overrides as a JSON {url: fraction} object),
+# per-pixel change threshold, and the longest a camera may go unprocessed
+MOTION_GATE = os.environ.get("MOTION_GATE", "1") == "1"
+MOTION_SENSITIVITY = float(os.environ.get("MOTION_SENSITIVITY", 0.002))
+MOTION_CAMERA_SENSITIVITY = json.loads(
+    os.environ.get("MOTION_CAMERA_SENSITIVITY", "{}")
+)
+MOTION_PIXEL_DELTA = int(os.environ.get("MOTION_PIXEL_DELTA", 25))
+MOTION_MAX_SKIP = float(os.environ.get("MOTION_MAX_SKIP", 5.0))
+
+# Adaptive sampling: total frames/sec shared by all cameras (lowered to the
+# measured inference throughput), per-camera rate limits, and how long
+# motion or a detected face keeps a camera at the raised rate
+SAMPLING_FPS_BUDGET = float(os.environ.get("SAMPLING_FPS_BUDGET", 20))
+SAMPLING_MIN_FPS = float(os.environ.get("SAMPLING_MIN_FPS", 0.5))
+SAMPLING_MAX_FPS = float(os.environ.get("SAMPLING_MAX_FPS", 10))
+SAMPLING_ACTIVE_SECONDS = float(os.environ.get("SAMPLING_ACTIVE_SECONDS", 10))
+
+# Face quality gate between detection and recognition: minimum combined
+# score (0 disables), face side in pixels below which a face is dropped and
+# above which size no longer matters, Laplacian variance of a sharp face,
+# and the yaw in degrees at which the pose score reaches zero
+QUALITY_MIN_SCORE = float(os.environ.get("QUALITY_MIN_SCORE", 0.5))
+QUALITY_MIN_FACE = int(os.environ.get("QUALITY_MIN_FACE", 24))
+QUALITY_GOOD_FACE = int(os.environ.get("QUALITY_GOOD_FACE", 80))
+QUALITY_MIN_SHARPNESS = float(os.environ.get("QUALITY_MIN_SHARPNESS", 100))
+QUALITY_MAX_YAW = float(os.environ.get("QUALITY_MAX_YAW", 60))
+
+# An alert is raised once a face matched the same criminal in K of its
+# last N sampled frames; K=1 alerts on the first match
+ALERT_CONFIRM_K = int(os.environ.get("ALERT_CONFIRM_K", 3))
+ALERT_CONFIRM_N = int(os.environ.get("ALERT_CONFIRM_N", 5))
+
+# Alert side effects (see alert_pipeline.py): alerts waiting before new
+# ones are dropped, worker tasks, sightings per database transaction,
+# retries before a batch goes to the journal, and the journal file
+ALERT_QUEUE_SIZE = int(os.environ.get("ALERT_QUEUE_SIZE", 100))
+ALERT_WORKERS = int(os.environ.get("ALERT_WORKERS", 2))
+ALERT_DB_BATCH = int(os.environ.get("ALERT_DB_BATCH", 50))
+ALERT_DB_RETRIES = int(os.environ.get("ALERT_DB_RETRIES", 3))
+ALERT_JOURNAL = os.environ.get("ALERT_JOURNAL") or os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "alerts.journal"
+)
+
+# Screenshot encoding threads, JPEG quality (0-100), and the longer side in
+# pixels of the preview sent with alerts and of the face thumbnail
+SCREENSHOT_WORKERS = int(os.environ.get("SCREENSHOT_WORKERS", 2))
+SCREENSHOT_JPEG_QUALITY = int(os.environ.get("SCREENSHOT_JPEG_QUALITY", 85))
+SCREENSHOT_PREVIEW_SIZE = int(os.environ.get("SCREENSHOT_PREVIEW_SIZE", 640))
+SCREENSHOT_THUMBNAIL_SIZE = int(os.environ.get("SCREENSHOT_THUMBNAIL_SIZE", 160))
+
+# Face tracking: minimum IoU to continue a track, frames a track survives
+# without a detection, and seconds before a tracked face is re-embedded
+TRACK_IOU_THRESHOLD = float(os.environ.get("TRACK_IOU_THRESHOLD", 0.3))
+TRACK_MAX_MISSED = int(os.environ.get("TRACK_MAX_MISSED", 10))
+TRACK_REFRESH_INTERVAL = float(os.environ.get("TRACK_REFRESH_INTERVAL", 2.0))
+
+# insightface model pack and the modules loaded from it; only detection and
+# recognition are used here, the attribute and landmark models just add cost
+FACE_MODEL_NAME = os.environ.get("FACE_MODEL_NAME", "buffalo_l")
+FACE_MODULES = os.environ.get("FACE_MODULES", "detection,recognition").split(",")
+FACE_DET_SIZE = int(os.environ.get("FACE_DET_SIZE", 640))
+FACE_DET_THRESH = float(os.environ.get("FACE_DET_THRESH", 0.5))
+# Comma separated onnxruntime providers in order of preference. The default
+# is insightface's own (CUDA, falling back to CPU); CPU-only nodes may set
+# CPUExecutionProvider to skip the CUDA probe
+FACE_PROVIDERS = os.environ.get(
+    "FACE_PROVIDERS", "CUDAExecutionProvider,CPUExecutionProvider"
+).split(",")
+FACE_CTX_ID = int(os.environ.get("FACE_CTX_ID", 0))
+# Modules replaced by the INT8 models written by quantize.py, e.g. recognition
+FACE_QUANTIZED_MODULES = [
+    module
+    for module in os.environ.get("FACE_QUANTIZED_MODULES", "").split(",")
+    if module
+]
+
+# Port of the prometheus /metrics endpoint, 0 disables it
+METRICS_PORT = int(os.environ.get("METRICS_PORT", 9108))
+# Interface it listens on; the endpoint is unauthenticated, so only expose
+# it (e.g. 0.0.0.0) on networks the scraper alone can reach
+METRICS_ADDRESS = os.environ.get("METRICS_ADDRESS", "127.0.0.1")
+
+# On-demand profiling (see profiling.py): output directory, default capture
+# length, and an optional unix socket path accepting "cpu|memory [seconds]"
+PROFILE_DIR = os.environ.get("PROFILE_DIR") or os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "profiles"
+)
+PROFILE_SECONDS = float(os.environ.get("PROFILE_SECONDS", 30))
+PROFILE_SOCKET = os.environ.get("PROFILE_SOCKET", "")
+
+# PostgreSQL connection pool of ai/models.Database, and how long a pooled
+# connection may sit idle before it is checked with SELECT 1
+DB_POOL_MIN = int(os.environ.get("DB_POOL_MIN", 1))
+DB_POOL_MAX = int(os.environ.get("DB_POOL_MAX", 8))
+DB_HEALTH_CHECK_INTERVAL = float(os.environ.get("DB_HEALTH_CHECK_INTERVAL", 30))
+
+# Gallery index, see gallery.build_index
+INDEX_MODE = os.environ.get("INDEX_MODE", "flat")
+INDEX_NPROBE = int(os.environ.get("INDEX_NPROBE", 16))
+INDEX_EF_SEARCH = int(os.environ.get("INDEX_EF_SEARCH", 64))
+INDEX_PQ_M = int(os.environ.get("INDEX_PQ_M", 64))
+
+
+def index_options():
+    return {
+        "mode": INDEX_MODE,
+        "nprobe": INDEX_NPROBE,
+        "ef_search": INDEX_EF_SEARCH,
+        "pq_m": INDEX_PQ_M,
+    }
+
+
+def face_model_options():
+    return {
+        "name": FACE_MODEL_NAME,
+        "modules": FACE_MODULES,
+        "det_size": FACE_DET_SIZE,
+        "det_thresh": FACE_DET_THRESH,
+        "providers": FACE_PROVIDERS,
+        "ctx_id": FACE_CTX_ID,
+        "quantized": FACE_QUANTIZED_MODULES,
+    }
@@ -1,5 +1,10 @@
+import logging
+import time
+
 from geopy.distance import geodesic
 
+from metrics import WEBSOCKET_SEND_SECONDS
+
 
 class WebSocketManager:
     def __init__(self):
@@ -27,12 +32,27 @@ class WebSocketManager:
         nearest_client, _ = self.find_nearest_client(camera_location)
         if nearest_client:
             if nearest_client.open:
-                await nearest_client.send(message)
+                await self.send(nearest_client, message)
 
     async def send_to_all(self, message):
         for web_client in self.web_clients:
             if web_client.open:
-                await web_client.send(message)
+                await self.send(web_client, message)
+
+    async def send(self, websocket, message):
+        start = time.perf_counter()
+        try:
+            await websocket.send(message)
+        finally:
+            seconds = time.perf_counter() - start
+            WEBSOCKET_SEND_SECONDS.observe(seconds)
+            # Per-client detail goes to the log, not to metric labels
+            if seconds > 1:
+                logging.warning(
+                    "Websocket send to %s took %.1fs",
+                    getattr(websocket, "remote_address", None),
+                    seconds,
+                )
 
     def find_nearest_client(self, camera_location):
         nearest_distance = float("inf")
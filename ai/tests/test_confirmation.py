@@ -0,0 +1,74 @@
+"""Run from the ai/ directory: python -m pytest tests"""
+import unittest
+from types import SimpleNamespace
+
+from confirmation import ConfirmationBuffer
+from tracker import FaceTracker
+
+URL = "rtsp://10.0.0.5/stream"
+
+
+class ConfirmationBufferTest(unittest.TestCase):
+    def test_confirms_after_k_matches(self):
+        buffer = ConfirmationBuffer(k=3, n=5)
+        results = [buffer.update(URL, 1, "7", now) for now in range(3)]
+        self.assertEqual(results, [False, False, True])
+
+    def test_needs_k_of_last_n(self):
+        buffer = ConfirmationBuffer(k=3, n=5)
+        for now, identity in enumerate(["7", None, None, None, "7"]):
+            self.assertFalse(buffer.update(URL, 1, identity, now))
+        # The first "7" fell out of the window
+        self.assertFalse(buffer.update(URL, 1, "7", 5))
+        self.assertTrue(buffer.update(URL, 1, "7", 6))
+
+    def test_cached_identity_does_not_vote(self):
+        buffer = ConfirmationBuffer(k=3, n=5)
+        self.assertFalse(buffer.update(URL, 1, "7", 0))
+        for now in range(1, 10):
+            self.assertFalse(buffer.update(URL, 1, "7", now, reidentified=False))
+        self.assertFalse(buffer.update(URL, 1, "7", 10))
+        self.assertTrue(buffer.update(URL, 1, "7", 11))
+
+    def test_cached_frames_keep_votes_alive(self):
+        buffer = ConfirmationBuffer(k=2, n=5, ttl=5)
+        buffer.update(URL, 1, "7", 0)
+        buffer.update(URL, 1, "7", 4, reidentified=False)
+        buffer.prune(8)
+        self.assertTrue(buffer.update(URL, 1, "7", 8))
+
+    def run_track(self, identities, fps=2.0):
+        """Feeds one face matched as identities[i] on frame i; returns confirmed_at."""
+        tracker = FaceTracker(refresh_interval=2.0)
+        buffer = ConfirmationBuffer(k=3, n=5)
+        face = SimpleNamespace(bbox=[10, 10, 60, 60])
+        embedded = []
+        for frame, identity in enumerate(identities):
+            now = frame / fps
+            (track,) = tracker.update([face], now)
+            if tracker.needs_embedding(track, now):
+                tracker.identified(track, identity, now)
+                embedded.append(now)
+            if buffer.update(URL, track.id, track.identity, now, track.reidentified):
+                track.confirmed = True
+                return now, embedded
+        return None, embedded
+
+    def test_brief_sighting_alerts(self):
+        # In view for about a second at 2 fps: every sampled frame votes
+        confirmed_at, _ = self.run_track(["7"] * 3)
+        self.assertEqual(confirmed_at, 1.0)
+
+    def test_unmatched_track_uses_refresh_interval(self):
+        _, embedded = self.run_track([None] * 8)
+        self.assertEqual(embedded, [0.0, 2.0])
+
+    def test_tracks_vote_only_when_reembedded(self):
+        # Missed at first, matched on the refresh, then voted frame by frame
+        confirmed_at, embedded = self.run_track([None] * 4 + ["7"] * 10)
+        self.assertEqual(embedded, [0.0, 2.0, 2.5, 3.0])
+        self.assertEqual(confirmed_at, 3.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+import time
+from collections import deque
+
+import numpy as np
+
+from metrics import FRAME_LATENCY_SECONDS, FRAME_STAGE_SECONDS, camera_label
+
+
+class FrameTrace:
+    """
+    Timestamps of one frame from capture on. captured_at is wall-clock
+    time, for alert payloads; marks are (stage, time.monotonic()) in the
+    order the frame went through the pipeline.
+    """
+
+    __slots__ = ("url", "captured_at", "marks")
+
+    def __init__(self, url):
+        self.url = url
+        self.captured_at = time.time()
+        self.marks = [("captured", time.monotonic())]
+
+    def mark(self, stage):
+        self.marks.append((stage, time.monotonic()))
+
+    def since_capture(self, stage):
+        """Seconds from capture to the last mark of stage, or None."""
+        for name, at in reversed(self.marks):
+            if name == stage:
+                return at - self.marks[0][1]
+        return None
+
+    def stages(self):
+        """(stage, seconds since the previous mark) for every mark after capture."""
+        return [
+            (stage, at - previous)
+            for (_, previous), (stage, at) in zip(self.marks, self.marks[1:])
+        ]
+
+
+class LatencyTracker:
+    """
+    Capture-to-stage latency per camera, e.g. capture to processed for
+    every frame and capture to delivered for alerts.
+    """
+
+    def __init__(self, window=1000):
+        self.window = window
+        self.latencies = {}  # (url, stage) -> deque of seconds
+
+    def record(self, trace, stage):
+        seconds = trace.since_capture(stage)
+        if seconds is None:
+            return
+        key = (trace.url, stage)
+        if key not in self.latencies:
+            self.latencies[key] = deque(maxlen=self.window)
+        self.latencies[key].append(seconds)
+        FRAME_LATENCY_SECONDS.labels(camera_label(trace.url), stage).observe(seconds)
+        if stage == "processed":
+            for name, seconds in trace.stages():
+                FRAME_STAGE_SECONDS.labels(name).observe(seconds)
+
+    def percentiles(self, url, stage, q=(50, 95, 99)):
+        latencies = self.latencies.get((url, stage))
+        if not latencies:
+            return None
+        values = np.percentile(np.fromiter(latencies, dtype=float), q)
+        return {p: float(v) for p, v in zip(q, values)}
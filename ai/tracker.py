@@ -0,0 +1,93 @@
+import itertools
+
+import numpy as np
+
+
+def iou(boxes_a, boxes_b):
+    """Pairwise intersection over union of (n, 4) and (m, 4) x1y1x2y2 boxes."""
+    a = np.asarray(boxes_a, dtype=np.float32).reshape(-1, 4)[:, None]
+    b = np.asarray(boxes_b, dtype=np.float32).reshape(-1, 4)[None]
+    width = np.minimum(a[..., 2], b[..., 2]) - np.maximum(a[..., 0], b[..., 0])
+    height = np.minimum(a[..., 3], b[..., 3]) - np.maximum(a[..., 1], b[..., 1])
+    width, height = np.clip(width, 0, None), np.clip(height, 0, None)
+    intersection = width * height
+    area_a = (a[..., 2] - a[..., 0]) * (a[..., 3] - a[..., 1])
+    area_b = (b[..., 2] - b[..., 0]) * (b[..., 3] - b[..., 1])
+    return intersection / np.maximum(area_a + area_b - intersection, 1e-6)
+
+
+class Track:
+    def __init__(self, track_id, bbox, now):
+        self.id = track_id
+        self.bbox = bbox
+        self.identity = None
+        self.embedded_at = None
+        self.reidentified = False  # identity came from this frame's embedding
+        self.confirmed = False  # the confirmation buffer accepted identity
+        self.last_seen = now
+        self.missed = 0
+
+
+class FaceTracker:
+    """
+    Greedy IoU tracker for the faces of one camera. Faces keep their track
+    between frames, so the recognition model only runs on new tracks and
+    on a periodic refresh of existing ones. A matched track awaiting
+    confirmation is embedded on every sampled frame, so each one votes.
+    """
+
+    ids = itertools.count(1)
+
+    def __init__(self, iou_threshold=0.3, max_missed=10, refresh_interval=2.0):
+        self.iou_threshold = iou_threshold
+        self.max_missed = max_missed
+        self.refresh_interval = refresh_interval
+        self.tracks = []
+        self.detections = 0
+        self.embeddings = 0
+
+    def update(self, faces, now):
+        """Returns the track of every face, in order."""
+        self.detections += len(faces)
+        assigned = [None] * len(faces)
+        if self.tracks and faces:
+            overlaps = iou([t.bbox for t in self.tracks], [f.bbox for f in faces])
+            pairs = np.argwhere(overlaps >= self.iou_threshold)
+            order = np.argsort(-overlaps[pairs[:, 0], pairs[:, 1]])
+            used = set()
+            for t, f in pairs[order]:
+                if t in used or assigned[f] is not None:
+                    continue
+                used.add(t)
+                assigned[f] = self.tracks[t]
+        matched = {id(track) for track in assigned if track is not None}
+        for track in self.tracks:
+            track.reidentified = False
+            if id(track) not in matched:
+                track.missed += 1
+        self.tracks = [t for t in self.tracks if t.missed <= self.max_missed]
+        for i, face in enumerate(faces):
+            track = assigned[i]
+            if track is None:
+                track = Track(next(self.ids), face.bbox, now)
+                self.tracks.append(track)
+                assigned[i] = track
+            track.bbox = face.bbox
+            track.last_seen = now
+            track.missed = 0
+        return assigned
+
+    def needs_embedding(self, track, now):
+        return (
+            track.embedded_at is None
+            or (track.identity is not None and not track.confirmed)
+            or now - track.embedded_at >= self.refresh_interval
+        )
+
+    def identified(self, track, identity, now):
+        if identity != track.identity:
+            track.confirmed = False
+        track.identity = identity
+        track.embedded_at = now
+        track.reidentified = True
+        self.embeddings += 1
@@ -1,49 +1,200 @@
+import threading
+import time
+
 import torch
 import insightface
+from insightface.app.common import Face
+from insightface.model_zoo import model_zoo
+from insightface.utils import face_align
 import cv2
 import os
 import numpy as np
-import faiss
+
+from embedding_cache import EmbeddingCache
+from gallery import GalleryIndex
+from settings import face_model_options
+
+
+def load_face_model(options=None):
+    """
+    Loads and prepares the insightface model (also used by inference workers).
+    options default to settings.face_model_options().
+    """
+    if options is None:
+        options = face_model_options()
+    det_size = options.get("det_size", 640)
+    try:
+        face_model = insightface.app.FaceAnalysis(
+            name=options.get("name", "buffalo_l"),
+            allowed_modules=options.get("modules"),
+            providers=options.get("providers"),
+        )
+        for taskname in options.get("quantized") or []:
+            use_quantized_model(face_model, taskname, options.get("providers"))
+        face_model.prepare(
+            ctx_id=options.get("ctx_id", 0),
+            det_thresh=options.get("det_thresh", 0.5),
+            det_size=(det_size, det_size),
+        )
+    except Exception as e:
+        print(f"Failed to load models: {e}")
+        raise
+    stages = ", ".join(
+        f"{stage} {ms:.1f} ms" for stage, ms in profile_face_model(face_model).items()
+    )
+    print(
+        f"Face model {det_size}x{det_size}: {stages} "
+        "(detection per frame, the rest per face)"
+    )
+    return face_model
+
+
+def quantized_model_path(model_file):
+    """Where quantize.py writes the INT8 copy of an insightface model file."""
+    model_dir, name = os.path.split(model_file)
+    return os.path.join(model_dir + "_int8", name)
+
+
+def use_quantized_model(face_model, taskname, providers=None):
+    fp32 = face_model.models[taskname]
+    path = quantized_model_path(fp32.model_file)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"{path} missing, create it with quantize.py")
+    model = model_zoo.get_model(path, providers=providers)
+    # insightface guesses input normalisation from the graph's first nodes,
+    # which quantization rewrites
+    model.input_mean = fp32.input_mean
+    model.input_std = fp32.input_std
+    face_model.models[taskname] = model
+    if taskname == "detection":
+        face_model.det_model = model
+    print(f"Using quantized {taskname} model {path}")
+
+
+def profile_face_model(face_model, runs=3):
+    """Average milliseconds each loaded module takes on a blank input."""
+    frame = np.zeros(face_model.det_size[::-1] + (3,), dtype=np.uint8)
+    face = Face(
+        bbox=np.array([0, 0, 112, 112], dtype=np.float32),
+        kps=face_align.arcface_dst.copy(),
+        det_score=1.0,
+    )
+    costs = {}
+    for taskname, model in face_model.models.items():
+        if taskname == "detection":
+            run = lambda: model.detect(frame, max_num=0, metric="default")
+        else:
+            run = lambda: model.get(frame, face)
+        run()  # the first run includes onnxruntime warm-up
+        start = time.perf_counter()
+        for _ in range(runs):
+            run()
+        costs[taskname] = (time.perf_counter() - start) / runs * 1000
+    return costs
+
+
+def detect_faces(face_model, frame):
+    """Runs only the detector of face_model; faces come back without embeddings."""
+    bboxes, kpss = face_model.det_model.detect(frame, max_num=0, metric="default")
+    return [
+        Face(
+            bbox=bboxes[i, 0:4],
+            kps=kpss[i] if kpss is not None else None,
+            det_score=bboxes[i, 4],
+        )
+        for i in range(bboxes.shape[0])
+    ]
+
+
+def embed_faces(face_model, frame, faces):
+    """Runs the remaining models (recognition, ...) on already detected faces."""
+    for face in faces:
+        for taskname, model in face_model.models.items():
+            if taskname == "detection":
+                continue
+            model.get(frame, face)
+    return faces
+
+
+def embedding_cache_path(root_dir):
+    """Embedding cache of a gallery directory for the configured recognizer."""
+    # fp32 and int8 embeddings must not share a cache
+    quantized = "recognition" in face_model_options().get("quantized", [])
+    return os.path.join(
+        root_dir, ".embeddings.int8.npz" if quantized else ".embeddings.npz"
+    )
 
 
 class FaceTrainer:
-    def __init__(self, root_dir):
+    def __init__(self, root_dir, cache_path=None, index_options=None):
         self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        self.root_dir = root_dir
+        self.face_model = load_face_model()
+
+        self.embedding_cache = EmbeddingCache(
+            cache_path or embedding_cache_path(root_dir)
+        )
+        self.cache_lock = threading.Lock()
+        self.gallery = GalleryIndex(**(index_options or {}))
+        self.gallery.sync(self.load_face_encodings(root_dir))
+        print(
+            f"Gallery loaded: {self.gallery.snapshot.size} faces, "
+            f"index mode {self.gallery.active_mode}"
+        )
 
-        try:
-            self.face_model = insightface.app.FaceAnalysis()
-            ctx_id = 0
-            self.face_model.prepare(ctx_id=ctx_id)
-        except Exception as e:
-            print(f"Failed to load models: {e}")
-            raise
+    def compute_embedding(self, image_path):
+        image = cv2.imread(image_path)
+        if image is None:
+            return None
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        faces = self.face_model.get(image)
+        if faces:
+            return faces[0].embedding
+        return None
 
-        self.index, self.known_face_names = self.load_face_encodings(root_dir)
-        print(self.index)
+    def _criminal_embeddings(self, dir_path, image_paths):
+        embeddings = []
+        for file_name in os.listdir(dir_path):
+            if file_name.endswith((".jpg", ".png")):
+                image_path = os.path.join(dir_path, file_name)
+                image_paths.append(image_path)
+                embedding = self.embedding_cache.get_or_compute(
+                    image_path, self.compute_embedding
+                )
+                if embedding is not None:
+                    embeddings.append(embedding)
+        return embeddings
 
     def load_face_encodings(self, root_dir):
-        known_face_encodings = []
-        known_face_names = []
-        for dir_name in os.listdir(root_dir):
-            dir_path = os.path.join(root_dir, dir_name)
-            if os.path.isdir(dir_path):
-                for file_name in os.listdir(dir_path):
-                    if file_name.endswith((".jpg", ".png")):
-                        image_path = os.path.join(dir_path, file_name)
-                        image = cv2.imread(image_path)
-                        image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-                        faces = self.face_model.get(image)
-
-                        if faces:
-                            face = faces[0]
-                            embedding = face.embedding
-                            known_face_encodings.append(embedding)
-                            known_face_names.append(dir_name)
-
-        known_face_encodings = np.array(known_face_encodings)
-        index = faiss.IndexFlatL2(known_face_encodings.shape[1])
-        index.add(known_face_encodings)
-        return index, known_face_names
+        """Returns {criminal id: (n, dim) embeddings} for every enrolled directory."""
+        encodings = {}
+        image_paths = []
+        with self.cache_lock:
+            for dir_name in os.listdir(root_dir):
+                dir_path = os.path.join(root_dir, dir_name)
+                if os.path.isdir(dir_path):
+                    embeddings = self._criminal_embeddings(dir_path, image_paths)
+                    if embeddings:
+                        encodings[dir_name] = np.array(embeddings, dtype=np.float32)
+            self.embedding_cache.prune(image_paths)
+            self.embedding_cache.save()
+        return encodings
+
+    def reload(self):
+        self.gallery.sync(self.load_face_encodings(self.root_dir))
+
+    def apply_enrollment(self, action, criminal_id):
+        """Updates a single criminal in the gallery after an API change."""
+        dir_path = os.path.join(self.root_dir, str(criminal_id))
+        embeddings = []
+        if action != "delete" and os.path.isdir(dir_path):
+            with self.cache_lock:
+                embeddings = self._criminal_embeddings(dir_path, [])
+                self.embedding_cache.save()
+        if embeddings:
+            self.gallery.replace(criminal_id, np.array(embeddings, dtype=np.float32))
+        else:
+            self.gallery.remove(criminal_id)
 
     @property
     def get_face_model(self):
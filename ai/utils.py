@@ -1,9 +1,6 @@
 import socket
-import numpy as np
 from jose import jwt
 from jose.exceptions import JWTError
-import cv2
-import os
 from datetime import datetime
 
 SECRET_KEY = "your_secret_key"  # Should be kept secret and safe
@@ -21,18 +18,9 @@ def host():
     return public_ip
 
 
-def save_screenshot(frame, camera_url, path):
-    if not isinstance(frame, np.ndarray) or frame.size == 0:
-        print("Invalid frame received, skipping screenshot.")
-        return None
-
-    if not os.path.exists(path):
-        os.makedirs(path)
-
-    timestamp = datetime.now().strftime("%Y-%m-%d|%H-%M-%S")
-    filename = f"{path}/{timestamp}|{camera_url.split('/')[2]}.jpg"
-    cv2.imwrite(filename, frame)
-    return filename
+def screenshot_filename(path, camera_url, when=None):
+    timestamp = (when or datetime.now()).strftime("%Y-%m-%d|%H-%M-%S")
+    return f"{path}/{timestamp}|{camera_url.split('/')[2]}.jpg"
 
 
 def generate_jwt(data):
@@ -0,0 +1,375 @@
+import asyncio
+import importlib
+import itertools
+import logging
+import multiprocessing
+import queue
+import threading
+import time
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+
+class FrameRing:
+    """
+    Fixed-size frame slots in one shared memory block. The main process
+    copies a decoded frame into a free slot and only the slot number and
+    shape cross the process boundary, never the pixels.
+    """
+
+    def __init__(self, slots, slot_bytes, name=None):
+        self.slots = slots
+        self.slot_bytes = slot_bytes
+        self.owner = name is None
+        self.shm = SharedMemory(name=name, create=self.owner, size=slots * slot_bytes)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def view(self, slot, shape, dtype=np.uint8):
+        return np.ndarray(
+            shape, dtype=dtype, buffer=self.shm.buf, offset=slot * self.slot_bytes
+        )
+
+    def fits(self, frame):
+        return frame.nbytes <= self.slot_bytes
+
+    def write(self, slot, frame):
+        if not self.fits(frame):
+            raise ValueError(
+                f"Frame of {frame.nbytes} bytes does not fit a {self.slot_bytes} byte slot"
+            )
+        self.view(slot, frame.shape, frame.dtype)[...] = frame
+
+    def close(self):
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+class FaceRecord(dict):
+    """Face returned by a worker, with attribute access like insightface's Face."""
+
+    __getattr__ = dict.get
+
+
+def load_factory(path):
+    module, name = path.rsplit(":", 1)
+    return getattr(importlib.import_module(module), name)
+
+
+def face_records(faces, embeddings=True):
+    records = []
+    for face in faces:
+        record = {
+            "bbox": face.bbox,
+            "kps": getattr(face, "kps", None),
+            "det_score": getattr(face, "det_score", None),
+        }
+        if embeddings:
+            record["embedding"] = face.embedding
+        records.append(record)
+    return records
+
+
+def match_records(gallery, records, threshold):
+    if not records:
+        return []
+    scores, labels = gallery.snapshot.search(
+        np.stack([r["embedding"] for r in records]), 1
+    )
+    return [
+        labels[i][0] if scores[i, 0] >= threshold else None
+        for i in range(len(records))
+    ]
+
+
+def worker_main(
+    index, ring_name, slots, slot_bytes, tasks, control, results, busy, options
+):
+    """
+    Inference worker: own face model, own gallery replica, frames from
+    shared memory. busy[index] holds the task being run, so the pool can
+    fail it if this process dies.
+    """
+    from gallery import GalleryIndex
+
+    ring = FrameRing(slots, slot_bytes, name=ring_name)
+    face_model = load_factory(options["model_factory"])()
+    gallery = GalleryIndex(**options["index_options"])
+    threshold = options["threshold"]
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        while True:
+            try:
+                op, criminal_id, embeddings = control.get_nowait()
+            except queue.Empty:
+                break
+            if op == "sync":
+                gallery.sync(embeddings)
+            elif op == "remove":
+                gallery.remove(criminal_id)
+            else:
+                getattr(gallery, op)(criminal_id, embeddings)
+        task_id, op, slot, shape, dtype, faces = task
+        busy[index] = task_id
+        try:
+            frame = ring.view(slot, shape, dtype)
+            if op == "detect":
+                from train import detect_faces
+
+                records = face_records(detect_faces(face_model, frame), False)
+                matches = None
+            elif op == "embed":
+                from insightface.app.common import Face
+                from train import embed_faces
+
+                faces = [Face(face) for face in faces]
+                records = face_records(embed_faces(face_model, frame, faces))
+                matches = match_records(gallery, records, threshold)
+            else:
+                records = face_records(face_model.get(frame))
+                matches = match_records(gallery, records, threshold)
+            results.put((task_id, records, matches, None))
+        except Exception as e:
+            results.put((task_id, None, None, repr(e)))
+        busy[index] = -1
+    ring.close()
+
+
+class InferenceWorkerPool:
+    """
+    Pool of inference processes, each holding its own face model and
+    gallery replica. Frames travel through a FrameRing; the number of
+    slots bounds how many frames are in flight.
+
+    The collector thread also watches the workers. The task a dead worker
+    was running is failed and its slot freed; if no worker is left, every
+    pending task is failed. Dead workers are respawned with backoff.
+    """
+
+    def __init__(
+        self,
+        processes,
+        index_options=None,
+        threshold=0.45,
+        slots=None,
+        slot_bytes=1920 * 1080 * 3,
+        model_factory="train:load_face_model",
+    ):
+        self.processes = processes
+        self.slots = slots or 2 * processes
+        self.slot_bytes = slot_bytes
+        self.ring = FrameRing(self.slots, slot_bytes)
+        self.context = multiprocessing.get_context("spawn")
+        self.tasks = self.context.Queue()
+        self.results = self.context.Queue()
+        self.busy = self.context.Array("q", [-1] * processes, lock=False)
+        self.options = {
+            "model_factory": model_factory,
+            "index_options": index_options or {},
+            "threshold": threshold,
+        }
+        self.controls = [None] * processes
+        self.workers = [None] * processes
+        self.started_at = [0.0] * processes
+        self.respawn_at = [None] * processes
+        self.backoff = [1.0] * processes
+        self.task_ids = itertools.count()
+        self.pending = {}
+        self.free_slots = None
+        self.gallery = None
+        self.loop = None
+        self.collector = None
+        self.stopping = False
+
+    def start(self, gallery=None):
+        """Starts the workers; with a gallery, replicas are seeded and kept in sync."""
+        self.loop = asyncio.get_running_loop()
+        self.free_slots = asyncio.Queue()
+        for slot in range(self.slots):
+            self.free_slots.put_nowait(slot)
+        self.gallery = gallery
+        if gallery is not None:
+            # Under the lock, so no change slips in between seed and listener
+            with gallery.lock:
+                gallery.listeners.append(self.on_gallery_change)
+        for index in range(self.processes):
+            self._spawn(index)
+        self.collector = threading.Thread(
+            target=self._collect, name="inference-results", daemon=True
+        )
+        self.collector.start()
+
+    def on_gallery_change(self, op, criminal_id, embeddings=None):
+        for control in self.controls:
+            if control is not None:
+                control.put((op, criminal_id, embeddings))
+
+    def _spawn(self, index):
+        """Starts worker index with a fresh control queue seeded from the gallery."""
+        control = self.context.Queue()
+        if self.gallery is not None:
+            # Listeners run under the gallery lock, so this seed is current
+            with self.gallery.lock:
+                control.put(("sync", None, dict(self.gallery.embeddings)))
+                self.controls[index] = control
+        else:
+            self.controls[index] = control
+        self.busy[index] = -1
+        worker = self.context.Process(
+            target=worker_main,
+            args=(
+                index,
+                self.ring.name,
+                self.slots,
+                self.slot_bytes,
+                self.tasks,
+                control,
+                self.results,
+                self.busy,
+                self.options,
+            ),
+            daemon=True,
+        )
+        worker.start()
+        self.workers[index] = worker
+        self.started_at[index] = time.monotonic()
+
+    def fits(self, frame):
+        """Whether frame fits a slot; larger frames must be inferred in-process."""
+        return self.ring.fits(frame)
+
+    async def acquire(self, frame):
+        """Copies frame into a free slot; returns the slot handle."""
+        slot = await self.free_slots.get()
+        try:
+            self.ring.write(slot, frame)
+        except Exception:
+            self.free_slots.put_nowait(slot)
+            raise
+        return slot, frame.shape, frame.dtype.str
+
+    async def submit(self, op, frame, faces=None):
+        """
+        Runs op on frame in a worker. The slot is freed when the worker is
+        done with it, so no slot is held between calls and a batch never
+        waits on slots its own frames hold.
+        """
+        handle = await self.acquire(frame)
+        task_id = next(self.task_ids)
+        future = self.loop.create_future()
+        # _resolve frees the slot, even if the caller was cancelled meanwhile
+        self.pending[task_id] = (future, handle[0])
+        try:
+            self.tasks.put((task_id, op, *handle, faces))
+        except BaseException:
+            del self.pending[task_id]
+            self.free_slots.put_nowait(handle[0])
+            raise
+        records, matches = await future
+        return [FaceRecord(record) for record in records], matches
+
+    async def infer(self, frame):
+        """Returns (faces, matched criminal id or None per face) for one frame."""
+        return await self.submit("infer", frame)
+
+    async def detect(self, frame):
+        """Runs only detection; returns the faces without embeddings."""
+        faces, _ = await self.submit("detect", frame)
+        return faces
+
+    async def embed(self, frame, faces):
+        """Embeds and matches faces detected in frame, copied into a slot again."""
+        if not faces:
+            return []
+        records = [dict(face) for face in faces]
+        _, matches = await self.submit("embed", frame, records)
+        return matches
+
+    def _collect(self):
+        while True:
+            try:
+                result = self.results.get(timeout=1)
+            except queue.Empty:
+                result = ()
+            if result is None:
+                break
+            if result:
+                self.loop.call_soon_threadsafe(self._resolve, *result)
+            if not self.stopping:
+                self._watch()
+
+    def _watch(self):
+        """Fails the tasks of dead workers and respawns them, with backoff."""
+        now = time.monotonic()
+        for index, worker in enumerate(self.workers):
+            if self.respawn_at[index] is not None:
+                if now >= self.respawn_at[index]:
+                    self.respawn_at[index] = None
+                    try:
+                        self._spawn(index)
+                    except Exception:
+                        logging.exception(
+                            "Respawning inference worker %d failed", index
+                        )
+                        self._schedule_respawn(index, now)
+                continue
+            if worker.is_alive():
+                continue
+            error = f"worker {index} exited with code {worker.exitcode}"
+            logging.error("Inference %s, respawning", error)
+            task_id = self.busy[index]
+            if task_id >= 0:
+                self.loop.call_soon_threadsafe(
+                    self._resolve, task_id, None, None, error
+                )
+            self.controls[index] = None
+            if now - self.started_at[index] > 60:
+                self.backoff[index] = 1.0
+            self._schedule_respawn(index, now)
+        if all(at is not None for at in self.respawn_at):
+            self.loop.call_soon_threadsafe(self._fail_all, "no worker is alive")
+
+    def _schedule_respawn(self, index, now):
+        self.respawn_at[index] = now + self.backoff[index]
+        self.backoff[index] = min(self.backoff[index] * 2, 60.0)
+
+    def _fail_all(self, error):
+        """Drops queued tasks and fails every pending future, freeing their slots."""
+        while True:
+            try:
+                self.tasks.get_nowait()
+            except queue.Empty:
+                break
+        for task_id in list(self.pending):
+            self._resolve(task_id, None, None, error)
+
+    def _resolve(self, task_id, records, matches, error):
+        entry = self.pending.pop(task_id, None)
+        if entry is None:
+            return  # already failed when its worker died
+        future, slot = entry
+        # The slot is only reusable once the worker is done with it, even
+        # if the caller was cancelled in the meantime.
+        self.free_slots.put_nowait(slot)
+        if future.done():
+            return
+        if error is not None:
+            future.set_exception(RuntimeError(f"Inference worker failed: {error}"))
+        else:
+            future.set_result((records, matches))
+
+    def shutdown(self):
+        self.stopping = True
+        for _ in self.workers:
+            self.tasks.put(None)
+        for worker in self.workers:
+            if worker is not None:
+                worker.join(timeout=5)
+        self.results.put(None)
+        self.ring.close()
@@ -0,0 +1,17 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from api.models import Camera, Criminals
+from api.utils import notify_metadata
+
+
+@receiver(post_save, sender=Camera)
+@receiver(post_delete, sender=Camera)
+def camera_changed(sender, instance, **kwargs):
+    notify_metadata("camera", instance.pk)
+
+
+@receiver(post_save, sender=Criminals)
+@receiver(post_delete, sender=Criminals)
+def criminal_changed(sender, instance, **kwargs):
+    notify_metadata("criminal", instance.pk)
@@ -1,6 +1,7 @@
 from geopy.distance import distance
 from string import ascii_letters
 from dotenv import load_dotenv
+from django.db import connection
 import numpy as np
 import insightface
 import psycopg2
@@ -11,6 +12,11 @@ import os
 
 load_dotenv()
 
+ENROLLMENT_CHANNEL = "criminals_enrollment"
+METADATA_CHANNEL = "metadata_changed"
+# Cosine similarity threshold, shared with the recognition server (ai/settings.py)
+SIMILARITY_THRESHOLD = float(os.environ.get("SIMILARITY_THRESHOLD", 0.45))
+
 
 def characters() -> list:
     letters = [chr(i) for i in list(range(97, 123)) + list(range(65, 91))]
@@ -63,21 +69,47 @@ def get_all_encodings_from_db():
         return None, None
 
 
-def is_similar(new_encoding, threshold=400):
+def is_similar(new_encoding, threshold=None):
+    if threshold is None:
+        threshold = SIMILARITY_THRESHOLD
     existing_names, existing_encodings = get_all_encodings_from_db()
     if existing_encodings.size == 0:
         return None
 
-    new_encoding = new_encoding.reshape(1, -1)
-    index = faiss.IndexFlatL2(existing_encodings.shape[1])
+    new_encoding = np.array(new_encoding, dtype=np.float32).reshape(1, -1)
+    existing_encodings = np.array(existing_encodings, dtype=np.float32)
+    faiss.normalize_L2(new_encoding)
+    faiss.normalize_L2(existing_encodings)
+    index = faiss.IndexFlatIP(existing_encodings.shape[1])
     index.add(existing_encodings)
     D, I = index.search(new_encoding, 1)
-    if D[0][0] < threshold:
+    if D[0][0] >= threshold:
         return existing_names[I[0][0]]
 
     return None
 
 
+def notify_enrollment(criminal_id, action):
+    """
+    Tells the recognition server (ai/server.py) that a criminal's
+    enrollment images changed, so it only re-embeds that criminal.
+    action is either "update" or "delete".
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT pg_notify(%s, %s);", (ENROLLMENT_CHANNEL, f"{action}:{criminal_id}")
+        )
+
+
+def notify_metadata(kind, pk):
+    """
+    Tells the recognition server to drop its cached copy of a camera or
+    criminal row. kind is either "camera" or "criminal".
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_notify(%s, %s);", (METADATA_CHANNEL, f"{kind}:{pk}"))
+
+
 def find_nearest_location(target_location, locations):
     """
     Find the nearest location in a list of locations to a target location.
@@ -15,7 +15,12 @@ from rest_framework.decorators import (
 )
 
 #  ######################### Local apps imports ###########################
-from api.utils import host_address, find_nearest_location, get_unique_key
+from api.utils import (
+    find_nearest_location,
+    notify_enrollment,
+    get_unique_key,
+    host_address,
+)
 from api.pagination import (
     CriminalsRecordsPagination,
     CriminalsPagination,
@@ -81,6 +86,10 @@ class CriminalsAPIView(ModelViewSet):
     filterset_class = CriminalsFilter
     pagination_class = CriminalsPagination
 
+    def perform_create(self, serializer):
+        serializer.save()
+        notify_enrollment(serializer.instance.pk, "update")
+
     def update(self, request, *args, **kwargs):
         instance = self.get_object()
         serializer = self.serializer_class(
@@ -88,6 +97,7 @@ class CriminalsAPIView(ModelViewSet):
         )
         serializer.is_valid(raise_exception=True)
         serializer.save()
+        notify_enrollment(instance.pk, "update")
         return Response(serializer.data)
 
     def partial_update(self, request, *args, **kwargs):
@@ -103,13 +113,17 @@ class CriminalsAPIView(ModelViewSet):
                 shutil.rmtree(path)
 
         serializer.save()
+        if image:
+            notify_enrollment(instance.pk, "update")
         return Response(serializer.data, status=status.HTTP_200_OK)
 
     def destroy(self, request, *args, **kwargs):
         path = os.path.join("media", "criminals", kwargs.get("pk"))
         if os.path.exists(path):
             shutil.rmtree(path)
-        return super().destroy(request, *args, **kwargs)
+        response = super().destroy(request, *args, **kwargs)
+        notify_enrollment(kwargs.get("pk"), "delete")
+        return response
 
 
 class BaseScreenshotsAPIView(APIView):